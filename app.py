@@ -1,107 +1,508 @@
 import streamlit as st
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
 import pandas as pd
-import re
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import diskcache
+import random
 import logging
-from io import StringIO
+from io import BytesIO, StringIO
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import os
+import inspect
+import importlib
+import types
 
 logging.basicConfig(level=logging.INFO)
 
-def scrape_kff_calculator(state, zip_code, age):
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        page.set_default_timeout(60000)  # Increase timeout to 60 seconds
+def disable_playwright_stack_capture():
+    """Stop Playwright calling inspect.stack() on every API call.
 
+    The stack is only used to decorate error messages, but walking it costs
+    a large share of driver CPU when thousands of calls are made per run.
+    The standard inspect module is left untouched for everything else.
+    """
+    no_stack = types.SimpleNamespace(**vars(inspect))
+    no_stack.stack = lambda *args, **kwargs: []
+    for name in ("playwright._impl._connection", "playwright._impl._sync_base"):
         try:
-            page.goto("https://www.kff.org/interactive/subsidy-calculator/")
+            module = importlib.import_module(name)
+        except ImportError:
+            continue
+        if hasattr(module, "inspect"):
+            module.inspect = no_stack
 
-            # Wait for the form to be visible
-            page.wait_for_selector("#subsidy-form", state="visible")
+# Opt in with PW_INSPECT_STACK=0
+if os.environ.get("PW_INSPECT_STACK") == "0":
+    disable_playwright_stack_capture()
 
-            # Fill out the form
-            page.select_option("#state-dd", state)
-            page.fill("input[name='zip']", zip_code)
-            page.fill("input[name='income']", "1000000")  # Use 1 million as income
-            page.click("#employer-coverage-0")  # Assume no employer coverage
-            page.select_option("#number-people", "1")  # 1-person household
+# Columns of the results table, in download order
+RESULT_COLUMNS = ["State", "Zip", "Age", "Unsubsidized Cost"]
 
-            if state.upper() in ["NY", "VT"]:
-                page.select_option("#number-people-alternate", "individual")
-            else:
-                # Always select 0 adults and 1 child
-                page.select_option("#number-adults", "0")
-                page.select_option("#number-children", "1")
-                page.select_option("select[name='children[0][age]']", str(age))
+# Number of ZIP codes scraped at the same time
+MAX_CONCURRENCY = 5
 
-            # Submit the form
-            page.click("input[type='submit'][value='Submit']")
+# Playwright timeout per action, in milliseconds
+PAGE_TIMEOUT = 15000
 
-            # Wait for results to load
-            page.wait_for_selector(".results-list", state="visible")
+# Attempts per ZIP when the page errors or times out
+MAX_ATTEMPTS = 3
 
-            # Extract the data
-            unsubsidized_cost = extract_unsubsidized_cost(page)
+# Refresh the status line every this many ZIP codes
+STATUS_EVERY = 10
 
-            browser.close()
+# Scraped costs are kept on disk, keyed by (state, zip_code, age)
+CACHE_DIR = ".kff_cache"
+CACHE_TTL = 30 * 24 * 60 * 60  # 30 days, in seconds
+MISSING_COSTS = (None, 0, "N/A")  # Cached values that still need a scrape
+cache = diskcache.Cache(CACHE_DIR)
 
-            return {
-                "State": state,
-                "Zip": zip_code,
-                "Age": age,
-                "Unsubsidized Cost": unsubsidized_cost,
+# Chromium flags for headless scraping; the calculator needs no GPU, images or extensions
+CHROMIUM_ARGS = [
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--no-sandbox",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-background-timer-throttling",
+    "--disable-renderer-backgrounding",
+    "--mute-audio",
+    "--blink-settings=imagesEnabled=false",
+]
+
+CALCULATOR_URL = "https://www.kff.org/interactive/subsidy-calculator/"
+
+STATES = (
+    "al", "ak", "az", "ar", "ca", "co", "ct", "de", "fl", "ga", "hi", "id", "il",
+    "in", "ia", "ks", "ky", "la", "me", "md", "ma", "mi", "mn", "ms", "mo", "mt",
+    "ne", "nv", "nh", "nj", "nm", "ny", "nc", "nd", "oh", "ok", "or", "pa", "ri",
+    "sc", "sd", "tn", "tx", "ut", "vt", "va", "wa", "wv", "wi", "wy",
+)
+
+# Sets every form field and fires the events the calculator listens for, in
+# the order a user would fill them (household fields appear after #number-people)
+FILL_FORM_JS = """
+    async (args) => {
+        const nextFrame = () => new Promise(resolve => requestAnimationFrame(resolve));
+        // Poll once per frame until check() holds, for up to args.timeout ms per field
+        const waitFor = async (check, error) => {
+            const deadline = performance.now() + args.timeout;
+            while (!check()) {
+                if (performance.now() > deadline) throw new Error(error);
+                await nextFrame();
             }
+        };
+        const fire = (el, ...types) =>
+            types.forEach(type => el.dispatchEvent(new Event(type, { bubbles: true })));
+
+        // Household and state-dependent fields render (or are enabled) only after
+        // the field before them changes
+        const field = async (selector) => {
+            await waitFor(() => {
+                const el = document.querySelector(selector);
+                return !!el && !el.disabled;
+            }, 'Element not found or disabled: ' + selector);
+            return document.querySelector(selector);
+        };
+        const set = async (selector, value) => {
+            const el = await field(selector);
+            el.focus();
+            el.value = value;
+            fire(el, 'input', 'change', 'blur');
+        };
+        // A select silently keeps an empty value when the option isn't there,
+        // so keep setting it until it sticks
+        const select = async (selector, value) => {
+            const el = await field(selector);
+            el.focus();
+            await waitFor(() => {
+                el.value = value;
+                return el.value === value;
+            }, `Option '${value}' never appeared in ${selector}`);
+            fire(el, 'change', 'blur');
+        };
+
+        // A reused page still shows the previous ZIP's county step; clear it so
+        // the ZIP lookup wait and FIRST_COUNTY_JS only see this ZIP's counties
+        const wrapper = document.querySelector('#county-wrapper');
+        if (wrapper) wrapper.style.display = 'none';
+        document.querySelectorAll("select#county-dd, select[name='locale']")
+            .forEach(select => { select.innerHTML = ''; select.disabled = true; });
+        const form = document.querySelector('#subsidy-form');
+        if (form) delete form.dataset.zipLoaded;
+
+        // A warm page already has the state picked; reselecting it resets the form
+        if (document.querySelector('#state-dd')?.value !== args.state) {
+            await select('#state-dd', args.state);
+        }
+        await set("input[name='zip']", args.zip);
+        await set("input[name='income']", '1000000');  // Use 1 million as income
+        (await field('#employer-coverage-0')).click();  // No employer coverage
+        await select('#number-people', '1');  // 1-person household
+
+        if (args.alternate) {
+            await select('#number-people-alternate', 'individual');
+        } else {
+            // Always select 0 adults and 1 child
+            await select('#number-adults', '0');
+            await select('#number-children', '1');
+            await select("select[name='children[0][age]']", args.age);
+        }
+
+        // Blank out the previous ZIP's cost so the render wait sees the new one
+        const dt = [...document.querySelectorAll('dt')]
+            .find(d => d.textContent.includes('Without financial help'));
+        if (dt?.nextElementSibling) dt.nextElementSibling.textContent = '';
+    }
+"""
+
+# How long FILL_FORM_JS waits for each field (and select option) to appear, in milliseconds
+FIELD_TIMEOUT = 5000
+
+# How long to wait for the ZIP lookup to populate the county step, in milliseconds
+ZIP_LOOKUP_TIMEOUT = 5000
+
+# True once the ZIP lookup has finished: the county wrapper is shown, the county
+# dropdown is enabled with a real option past the placeholder, or the form flags
+# the ZIP as loaded
+ZIP_LOADED_JS = """
+    () => {
+        const wrapper = document.querySelector('#county-wrapper');
+        const select = document.querySelector("select#county-dd, select[name='locale']");
+        return (!!wrapper && wrapper.style.display === 'block')
+            || (!!select && !select.disabled && select.options.length > 1)
+            || document.querySelector('#subsidy-form')?.dataset.zipLoaded === 'true';
+    }
+"""
+
+# Value of the first real county option (index 0 is the placeholder), or null
+# when the ZIP only covers one county and the dropdown is absent or disabled
+FIRST_COUNTY_JS = """
+    () => {
+        const select = document.querySelector('select#county-dd');
+        if (!select || select.disabled) return null;
+        const opts = select.querySelectorAll('option:not([disabled])');
+        return opts[1]?.value ?? null;
+    }
+"""
+
+# True once the "Without financial help" <dd> holds a dollar amount
+COST_RENDERED_JS = """
+    () => {
+        const dt = [...document.querySelectorAll('dt')]
+            .find(d => d.textContent.includes('Without financial help'));
+        return !!dt && /\\$\\d/.test(dt.nextElementSibling?.textContent || '');
+    }
+"""
+
+# Everything read back from the results page, in a single CDP round trip; the
+# cost is parsed in the browser, e.g. "$1,234" -> 1234 (null when missing)
+RESULTS_JS = """
+    () => {
+        const dt = [...document.querySelectorAll('dt')]
+            .find(d => d.textContent.includes('Without financial help'));
+        const match = dt?.nextElementSibling?.textContent.match(/\\$([\\d,]+)/);
+        return {
+            state: document.querySelector('#state-dd')?.value,
+            zip: document.querySelector("input[name='zip']")?.value,
+            income: document.querySelector("input[name='income']")?.value,
+            results: document.querySelector('.results-list')?.innerText,
+            cost: match ? Number(match[1].replace(/,/g, '')) : null,
+        };
+    }
+"""
 
-        except Exception as e:
-            logging.error(f"An error occurred while scraping: {str(e)}")
-            browser.close()
-            raise
+# Subresources the cost extraction never looks at; the calculator's own scripts
+# and XHRs still go through
+BLOCKED_RESOURCE_TYPES = {"image", "font", "stylesheet", "media"}
+BLOCKED_HOSTS = ("google-analytics", "googletagmanager", "doubleclick", "facebook", "hotjar")
 
-def extract_unsubsidized_cost(page):
+async def block_unneeded(route):
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or any(
+        host in request.url for host in BLOCKED_HOSTS
+    ):
+        await route.abort()
+    else:
+        await route.continue_()
+
+async def new_scrape_page(browser, storage_state=None):
+    """Open a page in its own context, optionally seeded with a warm context's cookies"""
+    context = await browser.new_context(
+        java_script_enabled=True,
+        bypass_csp=True,
+        viewport={"width": 800, "height": 600},
+        storage_state=storage_state,
+    )
+    await context.route("**/*", block_unneeded)
+    context.set_default_timeout(PAGE_TIMEOUT)
+    return await context.new_page()
+
+async def close_quietly(page):
+    """Close a page's context, ignoring a context or browser that is already gone"""
+    if page is None:
+        return
     try:
-        cost_text = page.inner_text(
-            "dt:has-text('Without financial help, your silver plan would cost:') + dd"
-        )
-        match = re.search(r"\$(\d+,?\d*)", cost_text)
-        if match:
-            return match.group(1)  # Return the cost as a string with comma
-        else:
-            return "N/A"
+        await page.context.close()
     except Exception as e:
-        logging.error(f"Error extracting unsubsidized cost: {str(e)}")
-        return "N/A"
+        logging.debug(f"Closing a dead page failed: {str(e)}")
+
+async def scrape_kff_calculator_async(page, state, zip_code, age, debug=False):
+    try:
+        # Pages are reused across ZIPs; only load the calculator when it isn't already up
+        if not page.url.startswith(CALCULATOR_URL) or await page.query_selector("#subsidy-form") is None:
+            await page.goto(CALCULATOR_URL)
+
+        # Wait for the form to be visible
+        await page.wait_for_selector("#subsidy-form", state="visible")
+
+        # Fill out the whole form in one round trip
+        await page.evaluate(FILL_FORM_JS, {
+            "state": state,
+            "zip": zip_code,
+            "age": str(age),
+            "alternate": state.upper() in ["NY", "VT"],
+            "timeout": FIELD_TIMEOUT,
+        })
 
-def process_csv(df, state, age):
+        # The ZIP is looked up over AJAX; wait for it instead of sleeping
+        try:
+            await page.wait_for_function(ZIP_LOADED_JS, timeout=ZIP_LOOKUP_TIMEOUT)
+        except Exception:
+            try:
+                await page.wait_for_selector(
+                    "#county-wrapper[style*='display: block']", timeout=ZIP_LOOKUP_TIMEOUT
+                )
+            except Exception:
+                pass  # No county step for this ZIP
+
+        # ZIPs spanning several counties get a county dropdown; take the first county
+        county = await page.evaluate(FIRST_COUNTY_JS)
+        if county:
+            await page.select_option("select#county-dd", county)
+
+        # Submit the form
+        await page.click("input[type='submit'][value='Submit']")
+
+        # Wait until the silver plan cost has actually been rendered
+        await page.wait_for_function(COST_RENDERED_JS)
+
+        # Extract the data
+        unsubsidized_cost = await extract_unsubsidized_cost(page)
+
+        return {
+            "State": state,
+            "Zip": zip_code,
+            "Age": age,
+            "Unsubsidized Cost": unsubsidized_cost,
+        }
+
+    except Exception as e:
+        logging.error(f"An error occurred while scraping: {str(e)}")
+        if debug:
+            await page.screenshot(path=f"debug_{zip_code}.png")
+        raise
+
+async def extract_unsubsidized_cost(page):
+    data = await page.evaluate(RESULTS_JS)
+    logging.debug(
+        f"Submitted state={data['state']} zip={data['zip']} income={data['income']}"
+    )
+    # No cost on the page is a failed lookup, not a $0 premium
+    if data["cost"] is None:
+        raise ValueError(f"No unsubsidized cost found for ZIP {data['zip']}")
+    return int(data["cost"])
+
+def retry_delay(attempt):
+    """Exponential backoff with jitter: ~2 s, ~4 s, ~7 s, ... capped at 30 s"""
+    return min(30, 1.5 * (2 ** attempt) + random.uniform(0, 1))
+
+async def scrape_batch(state, zips, age, debug=False, on_done=None):
+    """Scrape a list of ZIP codes in one browser, returning a result or exception per ZIP"""
+
+    async def _bounded(pages, browser, storage_state, zip_code):
+        for attempt in range(MAX_ATTEMPTS):
+            # None in the pool stands for a page that has to be opened first
+            page = await pages.get()
+            ok = False
+            try:
+                if page is None:
+                    page = await new_scrape_page(browser, storage_state)
+                result = await scrape_kff_calculator_async(page, state, zip_code, age, debug)
+                ok = True
+            except Exception:
+                # Timeouts, page errors and results without a cost are worth another try
+                if attempt == MAX_ATTEMPTS - 1:
+                    raise
+            finally:
+                # Whatever happens, one entry goes back so no task waits forever.
+                # A page in an unknown state (or one that never opened) is
+                # dropped and the next ZIP opens a fresh one
+                if ok:
+                    pages.put_nowait(page)
+                else:
+                    pages.put_nowait(None)
+                    await close_quietly(page)
+            if not ok:
+                await asyncio.sleep(retry_delay(attempt))
+                continue
+            if result["Unsubsidized Cost"] not in MISSING_COSTS:
+                cache.set((state, zip_code, age), result["Unsubsidized Cost"], expire=CACHE_TTL)
+            return result
+
+    # One browser for the whole batch; up to MAX_CONCURRENCY pages, each kept on the
+    # calculator between ZIPs so only the ZIP-specific fields change per lookup
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(
+            headless=True, args=CHROMIUM_ARGS, chromium_sandbox=False
+        )
+        try:
+            # Load the calculator once and seed every other context with its
+            # cookies (consent banner etc.) so they start from the same steady state
+            first = await new_scrape_page(browser)
+            storage_state = None
+            try:
+                await first.goto(CALCULATOR_URL)
+                storage_state = await first.context.storage_state()
+            except Exception as e:
+                logging.warning(f"Warm-up load failed, starting cold: {str(e)}")
+
+            pages = asyncio.Queue()
+            pages.put_nowait(first)
+            for _ in range(min(MAX_CONCURRENCY, len(zips)) - 1):
+                pages.put_nowait(await new_scrape_page(browser, storage_state))
+
+            tasks = [
+                asyncio.ensure_future(_bounded(pages, browser, storage_state, zip_code))
+                for zip_code in zips
+            ]
+            # Report progress as each ZIP finishes, whatever order they finish in
+            for finished in asyncio.as_completed(tasks):
+                try:
+                    await finished
+                except Exception:
+                    pass  # Kept on the task and returned below
+                if on_done is not None:
+                    on_done()
+            return [task.exception() or task.result() for task in tasks]
+        finally:
+            await browser.close()
+
+def scrape_shard(state, zips, age, debug=False):
+    """Worker-process entry point: run one shard of ZIPs with its own Chromium"""
+    results = asyncio.run(scrape_batch(state, zips, age, debug))
+    # Playwright exceptions don't always pickle; send back plain errors
+    return [RuntimeError(str(r)) if isinstance(r, Exception) else r for r in results]
+
+def to_csv_bytes(df):
+    """Encode a DataFrame as CSV with pyarrow's writer"""
+    buf = BytesIO()
+    pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), buf)
+    return buf.getvalue()
+
+@st.cache_data(ttl=86400, show_spinner=False)
+def lookup_zip(state, zip_code, age):
+    """Scrape a single ZIP code; repeat lookups within a day are served by Streamlit"""
+    # Returns a plain dict, so it is safe for cache_data; Playwright objects stay
+    # inside scrape_batch's event loop and are never cached. Failed lookups raise,
+    # and cache_data does not store exceptions, so they are retried next time
+    result = asyncio.run(scrape_batch(state, [zip_code], age))[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+def process_csv(df, state, age, workers=1, ignore_cache=False):
     results = []
-    total_rows = len(df)
-    
+    zips = df['zip_code'].astype('string').str.zfill(5).tolist()  # Ensure 5-digit ZIP codes
+    total_rows = len(zips)
+
+    # Repeated ZIPs are looked up once and fanned back out to every row below
+    unique_zips = list(dict.fromkeys(zips))
+    total_zips = len(unique_zips)
+
+    if ignore_cache:
+        for zip_code in unique_zips:
+            cache.delete((state, zip_code, age))
+
+    # Only ZIPs without a usable cached cost go back to the browser
+    cached_costs = {zip_code: cache.get((state, zip_code, age)) for zip_code in unique_zips}
+    to_scrape = [zip_code for zip_code in unique_zips if cached_costs[zip_code] in MISSING_COSTS]
+
     progress_bar = st.progress(0)
     status_text = st.empty()
+    processed = total_zips - len(to_scrape)
+    debug = st.session_state.get("debug", False)
 
-    for index, row in df.iterrows():
-        zip_code = str(row['zip_code']).zfill(5)  # Ensure 5-digit ZIP code
-        try:
-            result = scrape_kff_calculator(state, zip_code, age)
+    def _update_progress(count=1):
+        nonlocal processed
+        processed += count
+        progress_bar.progress(processed / total_zips)
+        if processed % STATUS_EVERY == 0 or processed == total_zips:
+            status_text.text(f"Processed {processed} of {total_zips} ZIP codes")
+
+    workers = max(1, min(workers, len(to_scrape)))
+    scraped = {}
+    if workers == 1:
+        if to_scrape:
+            outcomes = asyncio.run(scrape_batch(state, to_scrape, age, debug, _update_progress))
+            scraped = dict(zip(to_scrape, outcomes))
+    else:
+        # Each worker process runs its own async batch with its own Chromium
+        shards = [to_scrape[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(scrape_shard, state, shard, age, debug): shard
+                for shard in shards
+            }
+            for future in as_completed(futures):
+                shard = futures[future]
+                scraped.update(zip(shard, future.result()))
+                _update_progress(len(shard))
+
+    errors = []
+
+    for zip_code in zips:
+        result = scraped.get(zip_code)
+        if result is None:
+            result = {
+                "State": state,
+                "Zip": zip_code,
+                "Age": age,
+                "Unsubsidized Cost": cached_costs[zip_code],
+            }
+        if isinstance(result, Exception):
+            errors.append(f"{zip_code}: {str(result)}")
+        else:
             results.append(result)
-        except Exception as e:
-            st.error(f"Error processing ZIP code {zip_code}: {str(e)}")
-        
-        # Update progress
-        progress = (index + 1) / total_rows
-        progress_bar.progress(progress)
-        status_text.text(f"Processed {index + 1} of {total_rows} ZIP codes")
 
-    return pd.DataFrame(results)
+    # One summary instead of an error box per failed ZIP
+    if errors:
+        st.error(f"Error processing {len(errors)} of {total_rows} ZIP codes")
+        if debug:
+            st.text("\n".join(errors))
+
+    return pd.DataFrame(results, columns=RESULT_COLUMNS)
 
 def main():
     st.title("KFF Second Lowest Cost Silver Plan Scraper")
 
     st.sidebar.header("Input Parameters")
-    state = st.sidebar.selectbox(
-        "Select State",
-        ["al", "ak", "az", "ar", "ca", "co", "ct", "de", "fl", "ga", "hi", "id", "il", "in", "ia", "ks", "ky", "la", "me", "md", "ma", "mi", "mn", "ms", "mo", "mt", "ne", "nv", "nh", "nj", "nm", "ny", "nc", "nd", "oh", "ok", "or", "pa", "ri", "sc", "sd", "tn", "tx", "ut", "vt", "va", "wa", "wv", "wi", "wy"],
-    )
+    state = st.sidebar.selectbox("Select State", STATES)
     age = st.sidebar.number_input("Age of applicant", min_value=0, max_value=64, value=30)
+    workers = st.sidebar.number_input(
+        "Worker processes", min_value=1, max_value=os.cpu_count() or 1, value=1
+    )
+    ignore_cache = st.sidebar.checkbox("Ignore cache", help="Re-scrape every ZIP code in the CSV")
+    st.sidebar.checkbox("Debug output", key="debug")
+
+    single_zip = st.text_input("Look up a single ZIP code")
+    if single_zip and st.button("Look up ZIP"):
+        with st.spinner(f"Looking up {single_zip}..."):
+            try:
+                st.write(lookup_zip(state, single_zip.strip().zfill(5), age))
+            except Exception as e:
+                st.error(f"Error processing ZIP code {single_zip}: {str(e)}")
 
     uploaded_file = st.file_uploader("Choose a CSV file with ZIP codes", type="csv")
 
@@ -113,11 +514,12 @@ def main():
         if st.button("Process CSV"):
             with st.spinner("Processing ZIP codes... This may take a while."):
                 try:
-                    result_df = process_csv(df, state, age)
+                    result_df = process_csv(df, state, age, workers, ignore_cache)
                     st.success("Processing completed!")
-                    st.write(result_df)
+                    # Format dollars for display only; the download stays numeric
+                    st.dataframe(result_df.style.format({"Unsubsidized Cost": "${:,.0f}"}))
 
-                    csv = result_df.to_csv(index=False)
+                    csv = to_csv_bytes(result_df)
                     st.download_button(
                         label="Download results as CSV",
                         data=csv,
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Capture the network requests (and their responses) the KFF calculator fires when
+the form is submitted
+Used to find the backing endpoint so costs can be fetched without a browser
+"""
+
+from playwright.sync_api import sync_playwright
+import json
+import logging
+import sys
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+CALCULATOR_URL = "https://www.kff.org/interactive/subsidy-calculator/"
+
+# True once either calculator shows a cost: the subsidy calculator's "Without
+# financial help" <dd>, or the enhanced-credit calculator's bold-blue amounts
+RESULTS_RENDERED_JS = """
+    () => {
+        const dt = [...document.querySelectorAll('dt')]
+            .find(d => d.textContent.includes('Without financial help'));
+        return /\\$\\d/.test(dt?.nextElementSibling?.textContent || '')
+            || [...document.querySelectorAll('span.bold-blue')]
+                .some(span => /^\\$\\d/.test(span.textContent));
+    }
+"""
+
+# Responses longer than this are cut down in the saved JSON
+MAX_BODY_CHARS = 5000
+
+def capture_requests(state, zip_code, age, url=CALCULATOR_URL, headless=True):
+    """Submit the calculator form once and return every XHR/fetch request it made, with its response"""
+    requests = []
+
+    def on_request(request):
+        if request.resource_type in ("xhr", "fetch"):
+            requests.append(request)
+            logging.info(f"  {request.method} {request.url}")
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=headless)
+        page = browser.new_page()
+        page.set_default_timeout(60000)
+        page.on("request", on_request)
+
+        try:
+            page.goto(url)
+            page.wait_for_selector("#subsidy-form", state="visible")
+
+            # Same form values the scrapers use
+            page.select_option("#state-dd", state.lower())
+            page.fill("input[name='zip']", zip_code)
+            page.fill("input[name='income']", "1000000")
+            page.click("#employer-coverage-0")
+            page.select_option("#number-people", "1")
+
+            if state.upper() in ["NY", "VT"]:
+                page.select_option("#number-people-alternate", "individual")
+            else:
+                page.select_option("#number-adults", "0")
+                page.select_option("#number-children", "1")
+                page.select_option("select[name='children[0][age]']", str(age))
+
+            logging.info("Submitting form...")
+            page.click("input[type='submit'][value='Submit']")
+            # The submit is an XHR, not a navigation, so the load state was reached
+            # long ago; wait for the results to render instead
+            page.wait_for_function(RESULTS_RENDERED_JS)
+            page.wait_for_load_state("networkidle")
+
+            # Bodies are read after the page settles, outside the event handler
+            captured = [describe_request(request) for request in requests]
+        finally:
+            browser.close()
+
+    return captured
+
+def describe_request(request):
+    """Method, URL, headers and body of a request, plus status and body of its response"""
+    entry = {
+        "method": request.method,
+        "url": request.url,
+        "headers": request.headers,
+        "post_data": request.post_data,
+        "response": None,
+    }
+    response = request.response()
+    if response is not None:
+        try:
+            body = response.text()
+        except Exception as e:
+            body = f"<unreadable: {e}>"
+        entry["response"] = {
+            "status": response.status,
+            "content_type": response.headers.get("content-type"),
+            "body": body[:MAX_BODY_CHARS],
+        }
+    return entry
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python capture_kff_requests.py <state> <zip_code> [age] [--visible] [--url=<calculator url>]")
+        print("Example: python capture_kff_requests.py al 35004 30")
+        print("Example: python capture_kff_requests.py al 35004 0 "
+              "--url=https://www.kff.org/interactive/calculator-aca-enhanced-premium-tax-credit/")
+        sys.exit(1)
+
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    state = args[0]
+    zip_code = args[1].zfill(5)
+    age = int(args[2]) if len(args) > 2 else 30
+    headless = "--visible" not in sys.argv
+    url = next((a.split("=", 1)[1] for a in sys.argv if a.startswith("--url=")), CALCULATOR_URL)
+
+    captured = capture_requests(state, zip_code, age, url=url, headless=headless)
+
+    output_file = f"kff_requests_{zip_code}.json"
+    with open(output_file, "w") as f:
+        json.dump(captured, f, indent=2)
+
+    print(f"\nCaptured {len(captured)} XHR/fetch requests, saved to: {output_file}")
+    for entry in captured:
+        response = entry["response"] or {}
+        print(f"  {response.get('status', '---')} {entry['method']} {entry['url']} ({response.get('content_type')})")
+
+if __name__ == "__main__":
+    main()
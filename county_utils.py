@@ -0,0 +1,77 @@
+"""
+County name standardization shared by the rating-area merge scripts
+"""
+import re
+
+# State-specific county name fixes
+COUNTY_REPLACEMENTS = {
+    # Indiana fixes
+    'Kosclusko': 'Kosciusko',
+    'Deleware': 'Delaware',
+    'Davless': 'Daviess',
+    'Dubols': 'Dubois',
+    'Marlon': 'Marion',
+    
+    # Illinois fixes
+    'Dupage': 'DuPage',
+    'De Witt': 'DeWitt',
+    
+    # California fixes
+    'San Bernadino': 'San Bernardino',
+    
+    # Kansas fixes
+    'Chautaugua': 'Chautauqua',
+    
+    # North Dakota fixes
+    'Trail': 'Traill',
+    'Trailll': 'Traill',
+    'Traill': 'Traill',  # Already correct; keeps the single-pass regex from matching 'Trail'
+    
+    # Louisiana fixes
+    'Vermillion': 'Vermilion',
+    
+    # Texas fixes
+    'Culbertson': 'Culberson',
+    'Ochittree': 'Ochiltree',
+    'Wheiler': 'Wheeler',
+    
+    # Wisconsin fixes
+    'LaFayette': 'Lafayette',
+    
+    # Georgia fixes
+    'Heralson': 'Haralson',
+    'DeKalb': 'De Kalb',
+
+    # Florida fixes
+    'Desoto': 'DeSoto',
+    
+    # Minnesota fixes
+    'Lac Qui Parle': 'Lac qui Parle',
+    'Lac qui Parle': 'Lac qui Parle',
+    
+    # Ohio fixes
+    'Galia': 'Gallia',
+    
+    # South Dakota fixes
+    'Mc Cook': 'McCook',
+    'Bonn Homme': 'Bon Homme',
+    'DeBaca': 'De Baca',
+    
+    # Common variations
+    'Saint': 'St.',
+    'St ': 'St. '
+}
+
+# All replacements as one alternation, longest first so e.g. 'Trailll' wins over 'Trail'
+_COUNTY_PATTERN = re.compile(
+    '|'.join(re.escape(old) for old in sorted(COUNTY_REPLACEMENTS, key=len, reverse=True))
+)
+
+def standardize_county_names(counties):
+    """Standardize a Series of county names to handle common variations"""
+    counties = counties.str.strip()
+    counties = counties.str.replace(' County', '', regex=False).str.replace(' city', ' City', regex=False)
+    counties = counties.str.replace(' Parish', '', regex=False)  # For Louisiana parishes
+    counties = counties.str.replace('</p>', '', regex=False)  # Remove stray HTML tags
+    counties = counties.str.replace(_COUNTY_PATTERN, lambda m: COUNTY_REPLACEMENTS[m.group(0)], regex=True)
+    return counties.str.strip()
@@ -1,26 +1,31 @@
 import pandas as pd
 from pathlib import Path
 
-def generate_county_csv(input_csv: str, output_csv: str) -> None:
+from to_parquet import load_merged_results
+
+def generate_county_csv(input_csv: str, output_csv: str) -> pd.DataFrame:
     """
     Generate a CSV file containing unique counties and their information.
     
     Args:
-        input_csv (str): Path to the input CSV file
+        input_csv (str): Path to the merged results CSV (read through its Parquet copy, see to_parquet.py)
         output_csv (str): Path to save the output CSV file
+    
+    Returns:
+        pd.DataFrame: The unique counties that were written
     """
-    # Read the CSV file
-    df = pd.read_csv(input_csv)
+    # Read the merged results
+    df = load_merged_results(
+        input_csv, columns=['state', 'county_standardized', 'stcountyfp', 'rating_area']
+    )
     
-    # Group by state and county to get unique entries
-    # We'll use the first occurrence of each county for its information
-    county_data = df.groupby(['state', 'county_standardized']).agg({
-        'stcountyfp': 'first',
-        'rating_area': 'first'
-    }).reset_index()
+    # Keep the first occurrence of each county for its information
+    county_data = df.drop_duplicates(subset=['state', 'county_standardized'])[
+        ['state', 'county_standardized', 'stcountyfp', 'rating_area']
+    ].copy()
     
     # Ensure stcountyfp is properly formatted
-    county_data['stcountyfp'] = county_data['stcountyfp'].astype(str).str.zfill(5)
+    county_data['stcountyfp'] = county_data['stcountyfp'].astype('string').str.zfill(5)
     
     # Sort by state and county
     county_data = county_data.sort_values(['state', 'county_standardized'])
@@ -29,8 +34,11 @@ def generate_county_csv(input_csv: str, output_csv: str) -> None:
     output_path = Path(output_csv)
     output_path.parent.mkdir(parents=True, exist_ok=True)
     
-    # Write to CSV file
+    # Write to CSV file, plus a Parquet copy for scripts further down the pipeline
     county_data.to_csv(output_csv, index=False)
+    county_data.to_parquet(output_path.with_suffix('.parquet'), index=False)
+    
+    return county_data
 
 def main():
     # Use the specific file path
@@ -38,14 +46,12 @@ def main():
     output_file = "/Users/daphnehansell/Documents/GitHub/slspc/county_ratings.csv"
     
     try:
-        generate_county_csv(input_file, output_file)
+        county_data = generate_county_csv(input_file, output_file)
         print(f"Successfully generated {output_file}")
         
-        # Print some basic statistics
-        df = pd.read_csv(input_file)
-        unique_counties = df.groupby(['state', 'county_standardized']).size().reset_index()
-        print(f"\nTotal number of unique counties: {len(unique_counties)}")
-        print(f"Number of states: {len(df['state'].unique())}")
+        # Print some basic statistics from the counties already in memory
+        print(f"\nTotal number of unique counties: {len(county_data)}")
+        print(f"Number of states: {county_data['state'].nunique()}")
         
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -5,9 +5,11 @@ Based on filter3.py logic but updated for current rating areas
 """
 import pandas as pd
 
+from to_parquet import load_merged_results
+
 def filter_zip_codes(input_path, output_path):
-    # Read the CSV file
-    df = pd.read_csv(input_path)
+    # Read the merged results (see to_parquet.py)
+    df = load_merged_results(input_path)
 
     # List of valid states (50 states + DC)
     valid_states = {
@@ -24,18 +26,19 @@ def filter_zip_codes(input_path, output_path):
     # Remove rows with missing rating areas
     df = df[df['rating_area'].notna()]
 
-    # Find ZIP codes that appear in only one county
-    zip_county_counts = df.groupby('zip_code')['county_standardized'].nunique()
-    single_county_zips = zip_county_counts[zip_county_counts == 1].index
-    df = df[df['zip_code'].isin(single_county_zips)]
+    # Keep ZIP codes that appear in only one county
+    df = df[df.groupby('zip_code')['county_standardized'].transform('nunique').eq(1)]
 
     # Group by state and rating area, then select one random ZIP code from each group
     df['state_rating_area'] = df['state'] + '_' + df['rating_area'].astype(str)
 
-    # Use groupby and sample to select one random ZIP code per state-rating area
-    sampled_df = df.groupby('state_rating_area').apply(
-        lambda x: x.sample(n=1, random_state=42)
-    ).reset_index(drop=True)
+    # Shuffle once and keep the first row of each state-rating area
+    sampled_df = (
+        df.sample(frac=1, random_state=42)
+        .drop_duplicates(subset='state_rating_area', keep='first')
+        .sort_values('state_rating_area')
+        .reset_index(drop=True)
+    )
 
     # Keep only the ZIP code column and save
     final_df = pd.DataFrame({'zip_code': sampled_df['zip_code']})
@@ -1,84 +1,49 @@
 import pandas as pd
 import numpy as np
+import functools
 import logging
+import os
+from pathlib import Path
+
+from county_utils import standardize_county_names
+from to_parquet import load_merged_results
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def standardize_county_name(county):
-    """Standardize county names to handle common variations"""
-    if pd.isna(county):
-        return county
-    
-    county = str(county).strip()
-    
-    # Remove 'County' and standardize city
-    county = county.replace(' County', '').replace(' city', ' City')
-    county = county.replace(' Parish', '')  # For Louisiana parishes
-    county = county.replace('</p>', '')  # Remove stray HTML tags
-    
-    # State-specific fixes
-    replacements = {
-        # Indiana fixes
-        'Kosclusko': 'Kosciusko',
-        'Deleware': 'Delaware',
-        'Davless': 'Daviess',
-        'Dubols': 'Dubois',
-        'Marlon': 'Marion',
-        
-        # Illinois fixes
-        'Dupage': 'DuPage',
-        'De Witt': 'DeWitt',
-        
-        # California fixes
-        'San Bernadino': 'San Bernardino',
-        
-        # Kansas fixes
-        'Chautaugua': 'Chautauqua',
-        
-        # North Dakota fixes
-        'Trail': 'Traill',
-        'Trailll': 'Traill',
-        
-        # Louisiana fixes
-        'Vermillion': 'Vermilion',
-        
-        # Texas fixes
-        'Culbertson': 'Culberson',
-        'Ochittree': 'Ochiltree',
-        'Wheiler': 'Wheeler',
-        
-        # Wisconsin fixes
-        'LaFayette': 'Lafayette',
-        
-        # Georgia fixes
-        'Heralson': 'Haralson',
-        'DeKalb': 'De Kalb',
-    
-        # Florida fixes
-        'Desoto': 'DeSoto',
-        
-        # Minnesota fixes
-        'Lac Qui Parle': 'Lac qui Parle',
-        'Lac qui Parle': 'Lac qui Parle',
-        
-        # Ohio fixes
-        'Galia': 'Gallia',
-        
-        # South Dakota fixes
-        'Mc Cook': 'McCook',
-        'Bonn Homme': 'Bon Homme',
-        'DeBaca': 'De Baca',
-        
-        # Common variations
-        'Saint': 'St.',
-        'St ': 'St. '
-    }
-    
-    for old, new in replacements.items():
-        county = county.replace(old, new)
-    
-    return county.strip()
+# Set DEBUG_UNMATCHED=1 to print and save the unmatched-records report
+DEBUG_UNMATCHED = os.environ.get('DEBUG_UNMATCHED', '0') == '1'
+
+# Los Angeles ZIP3s (CA): area 16 ZIP3s always get 16, area 15 ZIP3s get 15
+# only when neither the ZIP3 nor the county lookup matches
+LA_AREA_15_ZIP3S = {'906', '907', '908', '910', '911', '912', '915', '917', '918', '935'}
+LA_AREA_16_ZIP3S = {'900', '902', '903', '904', '905', '913', '914', '916', '923', '928', '932'}
+
+# Each areas CSV gets a standardized copy next to it (areas.csv -> areas.std.parquet),
+# rebuilt whenever the CSV is newer
+AREAS_CACHE_SUFFIX = '.std.parquet'
+
+def prepare_areas(areas_df):
+    """Standardize COUNTY_ZIP3 and flag which rows are ZIP3 (rather than county) entries"""
+    areas_df = areas_df.copy()
+    areas_df['COUNTY_ZIP3'] = standardize_county_names(areas_df['COUNTY_ZIP3'])
+    areas_df['is_zip3'] = areas_df['COUNTY_ZIP3'].str.fullmatch(r'\d+', na=False)
+    return areas_df
+
+@functools.lru_cache(maxsize=1)
+def _load_areas(path, mtime):
+    cache_path = Path(path).with_suffix(AREAS_CACHE_SUFFIX)
+    if cache_path.exists() and cache_path.stat().st_mtime >= mtime:
+        return pd.read_parquet(cache_path)
+    areas_df = prepare_areas(
+        pd.read_csv(path, usecols=['STATE', 'COUNTY_ZIP3', 'AREA'], engine='pyarrow')
+    )
+    areas_df.to_parquet(cache_path, index=False)
+    return areas_df
+
+def load_areas(path='areas.csv'):
+    """Load areas.csv already standardized, from memory or the Parquet cache while current"""
+    return _load_areas(path, os.path.getmtime(path))
 
 def merge_rating_areas(zip_county_df, areas_df):
     """
@@ -109,42 +74,46 @@ def merge_rating_areas(zip_county_df, areas_df):
     non_territory_mask = ~result['state'].isin(territories)
     non_territory_records = result[non_territory_mask]
     
-    # Standardize county names for non-territory records
-    non_territory_records['county_standardized'] = non_territory_records['county_standardized'].apply(standardize_county_name)
-    areas_df['COUNTY_ZIP3'] = areas_df['COUNTY_ZIP3'].apply(standardize_county_name)
-    
-    # Create mapping dictionary for ZIP3-based areas
-    zip3_mapping = {}
-    for _, row in areas_df.iterrows():
-        if str(row['COUNTY_ZIP3']).isdigit():
-            zip3_mapping[(row['STATE'], row['COUNTY_ZIP3'])] = row['AREA']
-    
-    # Create mapping for county-based areas
-    county_mapping = {}
-    for _, row in areas_df.iterrows():
-        if not str(row['COUNTY_ZIP3']).isdigit():
-            county_mapping[(row['STATE'], row['COUNTY_ZIP3'])] = row['AREA']
-    
-    # Process non-territory records
-    for idx, row in non_territory_records.iterrows():
-        # Handle Los Angeles ZIP3s specially
-        if row['state'] == 'CA':
-            if row['ZIP3'] in ['906', '907', '908', '910', '911', '912', '915', '917', '918', '935']:
-                result.at[idx, 'rating_area'] = '15'
-            elif row['ZIP3'] in ['900', '902', '903', '904', '905', '913', '914', '916', '923', '928', '932']:
-                result.at[idx, 'rating_area'] = '16'
-                continue
-        
-        # Try ZIP3-based matching
-        key = (row['state'], row['ZIP3'])
-        if key in zip3_mapping:
-            result.at[idx, 'rating_area'] = zip3_mapping[key]
-            continue
-            
-        # Try county-based matching
-        key = (row['state'], row['county_standardized'])
-        if key in county_mapping:
-            result.at[idx, 'rating_area'] = county_mapping[key]
+    # Standardize county names for non-territory records; areas from load_areas
+    # are already standardized
+    county_keys = standardize_county_names(non_territory_records['county_standardized'])
+    if 'is_zip3' not in areas_df.columns:
+        areas_df = prepare_areas(areas_df)
+    
+    # Split areas into ZIP3-based and county-based lookup tables
+    # (keep='last' matches the old dict-building loops, where later rows won)
+    is_zip3 = areas_df.pop('is_zip3')
+    zip3_areas = areas_df[is_zip3].rename(
+        columns={'STATE': 'state', 'COUNTY_ZIP3': 'zip3', 'AREA': 'rating_area_zip3'}
+    ).astype({'zip3': 'int32'}).drop_duplicates(subset=['state', 'zip3'], keep='last')
+    county_areas = areas_df[~is_zip3].rename(
+        columns={'STATE': 'state', 'COUNTY_ZIP3': 'county_key', 'AREA': 'rating_area_county'}
+    ).drop_duplicates(subset=['state', 'county_key'], keep='last')
+    
+    # Los Angeles overrides, worked out before the lookups
+    is_ca = non_territory_records['state'] == 'CA'
+    la_areas = pd.Series(index=non_territory_records.index, dtype=object)
+    la_15 = la_areas.mask(is_ca & non_territory_records['ZIP3'].isin(LA_AREA_15_ZIP3S), '15')
+    la_16 = la_areas.mask(is_ca & non_territory_records['ZIP3'].isin(LA_AREA_16_ZIP3S), '16')
+    
+    # Look up both matches for every non-territory record, preferring ZIP3
+    # (ZIP3 is joined as an integer, e.g. '005' -> 5; the string column is for output)
+    matches = non_territory_records[['state']].assign(
+        zip3=non_territory_records['zip_code'].astype('int32') // 100,
+        county_key=county_keys,
+    )
+    matches = matches.merge(zip3_areas, on=['state', 'zip3'], how='left', validate='m:1')
+    matches = matches.merge(county_areas, on=['state', 'county_key'], how='left', validate='m:1')
+    matches.index = non_territory_records.index
+    
+    # Precedence: LA area 16, ZIP3 match, county match, LA area 15
+    rating_area = (
+        la_16.combine_first(matches['rating_area_zip3'])
+        .combine_first(matches['rating_area_county'])
+        .combine_first(la_15)
+    )
+    
+    result.loc[non_territory_mask, 'rating_area'] = rating_area
     
     # Generate report
     total_records = len(result)
@@ -154,6 +123,12 @@ def merge_rating_areas(zip_county_df, areas_df):
     print(f"Successfully matched: {matched_records}")
     print(f"Success rate: {(matched_records/total_records)*100:.2f}%")
     
+    # The unmatched-records report is only built when asked for
+    if not DEBUG_UNMATCHED:
+        if matched_records < total_records:
+            print(f"Unmatched: {total_records - matched_records} (set DEBUG_UNMATCHED=1 for details)")
+        return result
+    
     # Get unmatched records
     unmatched = result[result['rating_area'].isna()].copy()
     
@@ -166,13 +141,19 @@ def merge_rating_areas(zip_county_df, areas_df):
         unmatched_sorted = unmatched.sort_values(['state', 'county_original', 'zip_code'])
         
         # Create comparison with rating areas file
-        rating_areas_counties = areas_df[~areas_df['COUNTY_ZIP3'].str.isdigit()].copy()
-        rating_areas_counties = rating_areas_counties[['STATE', 'COUNTY_ZIP3']].rename(
-            columns={'STATE': 'state', 'COUNTY_ZIP3': 'rating_area_county'})
+        # Reuses the county-based lookup split above instead of re-scanning areas_df
+        rating_areas_counties = county_areas[['state', 'county_key']].rename(
+            columns={'county_key': 'rating_area_county'})
         
         # Add column showing available counties in rating areas file
-        unmatched_sorted['available_counties'] = unmatched_sorted['state'].map(
-            rating_areas_counties.groupby('state')['rating_area_county'].apply(lambda x: ', '.join(sorted(set(x)))))
+        available_counties = (
+            rating_areas_counties.drop_duplicates()
+            .sort_values(['state', 'rating_area_county'])
+            .groupby('state')['rating_area_county']
+            .agg(', '.join)
+            .to_dict()
+        )
+        unmatched_sorted['available_counties'] = unmatched_sorted['state'].map(available_counties)
         
         # Select and reorder columns for output
         output_columns = [
@@ -200,10 +181,17 @@ def main():
     try:
         # Load data
         logger.info("Loading data files...")
-        areas_df = pd.read_csv('areas.csv')
+        areas_df = load_areas('areas.csv')
         print(f"Successfully loaded areas.csv with {len(areas_df)} rows")
         
-        zip_county_df = pd.read_csv('ZIP-COUNTY-FIPS_2017-06.csv')
+        # ZIPs come in as strings so leading zeros survive; STCOUNTYFP is left numeric
+        # to keep merged_results_v9.csv's format
+        zip_county_df = pd.read_csv(
+            'ZIP-COUNTY-FIPS_2017-06.csv',
+            usecols=['ZIP', 'COUNTYNAME', 'STATE', 'STCOUNTYFP', 'CLASSFP'],
+            dtype={'ZIP': 'string', 'COUNTYNAME': 'string', 'STATE': 'category', 'CLASSFP': 'category'},
+            engine='pyarrow',
+        )
         print(f"Successfully loaded ZIP-COUNTY file with {len(zip_county_df)} rows")
         
         logger.info("Processing merge...")
@@ -214,6 +202,10 @@ def main():
         result_df.to_csv(output_path, index=False)
         print(f"\nResults saved to: {output_path}")
         
+        # Parquet copy for the downstream scripts, built the same way they rebuild it
+        load_merged_results(output_path, columns=['zip_code'])
+        print(f"Parquet copy saved to: {Path(output_path).with_suffix('.parquet')}")
+        
     except FileNotFoundError as e:
         print(f"Error: Could not find input file: {e}")
     except Exception as e:
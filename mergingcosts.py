@@ -1,32 +1,36 @@
 import pandas as pd
 
+from to_parquet import load_merged_results
+
 # Read the CSV files
 scraped_df = pd.read_csv('/Users/daphnehansell/Documents/GitHub/slspc/zip_30_amount - scraped_SLSPC.csv')
-full_df = pd.read_csv('/Users/daphnehansell/Documents/GitHub/slspc/merged_results_v9.csv')
+full_df = load_merged_results('/Users/daphnehansell/Documents/GitHub/slspc/merged_results_v9.csv')
 
 # Clean up column names and data
 scraped_df = scraped_df.rename(columns={'Zip': 'zip_code', 'Unsubsidized Cost': 'slspc'})
 # Remove any commas from the SLSPC values and convert to float
 scraped_df['slspc'] = scraped_df['slspc'].str.replace(',', '').astype(float)
 
-# Convert zip codes to strings with leading zeros in both dataframes
+# Convert zip codes to strings with leading zeros (the Parquet file already has them)
 scraped_df['zip_code'] = scraped_df['zip_code'].astype(str).str.zfill(5)
-full_df['zip_code'] = full_df['zip_code'].astype(str).str.zfill(5)
 
 # Merge the scraped data with the full dataset
 merged_df = full_df.merge(scraped_df[['zip_code', 'slspc']], 
                          on='zip_code', 
-                         how='left')
-
-# Create a mapping of SLSPC values for each state and rating area
-slspc_mapping = merged_df.groupby(['state', 'rating_area'])['slspc'].first().reset_index()
-
-# Fill in missing SLSPC values using the mapping
-final_df = merged_df.copy()
-for _, row in slspc_mapping.iterrows():
-    mask = ((final_df['state'] == row['state']) & 
-            (final_df['rating_area'] == row['rating_area']))
-    final_df.loc[mask, 'slspc'] = row['slspc']
+                         how='left',
+                         validate='m:1')
+
+# Group keys as categoricals so groupby works on integer codes
+for col in ('state', 'rating_area'):
+    merged_df[col] = merged_df[col].astype('category')
+
+# Give every row the first SLSPC value of its state and rating area
+# (rows without a rating area aren't grouped, so they keep their own value)
+merged_df['slspc'] = (
+    merged_df.groupby(['state', 'rating_area'], observed=True)['slspc'].transform('first')
+    .fillna(merged_df['slspc'])
+)
+final_df = merged_df
 
 # Save the result to a new CSV
 output_path = '/Users/daphnehansell/Documents/GitHub/slspc/merged_results_with_slspc.csv'
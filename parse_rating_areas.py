@@ -2,50 +2,37 @@
 import re
 from bs4 import BeautifulSoup
 
+# Rating area label in an xl65 cell, e.g. "Rating Area 3" or "Rating Area 12N"
+RATING_AREA_RE = re.compile(r'Rating Area (\d+[SN]?)')
+
 def parse_cms_rating_areas(html_file, state):
     """Parse CMS rating area HTML files to extract county-to-rating-area mappings"""
 
     with open(html_file, 'r', encoding='utf-8') as f:
         html = f.read()
 
-    soup = BeautifulSoup(html, 'html.parser')
-
-    # Find all td elements with class xl65 (rating areas) and xl66 (counties)
-    rating_area_cells = soup.find_all('td', class_='xl65')
-    county_cells = soup.find_all('td', class_='xl66')
+    soup = BeautifulSoup(html, 'lxml')  # libxml2-backed; much faster than html.parser
 
     results = []
 
-    # Process county cells and match with rating areas
-    for i, county_cell in enumerate(county_cells):
-        county = county_cell.get_text(strip=True)
+    # Walk rating area (xl65) and county (xl66) cells in document order; each
+    # county belongs to the most recent rating area seen before it
+    rating_area = None
+    for cell in soup.find_all('td', class_=['xl65', 'xl66']):
+        text = cell.get_text(strip=True)
+
+        if 'xl65' in cell.get('class', []):
+            match = RATING_AREA_RE.search(text)
+            if match:
+                rating_area = match.group(1)
+            continue
 
         # Skip header row
-        if county == 'County' or not county:
+        if text == 'County' or not text:
             continue
 
-        # Find the corresponding rating area (should be just before this county)
-        # Look backwards through rating area cells
-        rating_area = None
-        for ra_cell in rating_area_cells:
-            ra_text = ra_cell.get_text(strip=True)
-            match = re.search(r'Rating Area (\d+[SN]?)', ra_text)
-            if match:
-                # Check if this rating area cell comes before our county cell in the document
-                if ra_cell.sourceline and county_cell.sourceline:
-                    if ra_cell.sourceline <= county_cell.sourceline:
-                        rating_area = match.group(1)
-
-        if not rating_area:
-            # Try a simpler approach - just find the nearest rating area text before this county
-            # Get all text before this point
-            all_text = html[:html.find(str(county_cell))]
-            matches = re.findall(r'Rating Area (\d+[SN]?)', all_text)
-            if matches:
-                rating_area = matches[-1]  # Get the last/most recent rating area
-
-        if county and rating_area:
-            results.append(f"{state},{rating_area},{county}")
+        if rating_area:
+            results.append(f"{state},{rating_area},{text}")
 
     return results
 
@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 
+from to_parquet import load_merged_results
+
 def merge_kff_data(kff_file_path, zip_mapping_path, output_path):
     """
     Merge KFF data with ZIP code mapping and create output with state, rating area, and cost.
@@ -9,63 +11,67 @@ def merge_kff_data(kff_file_path, zip_mapping_path, output_path):
     # Read the input files
     print("Reading input files...")
     kff_data = pd.read_csv(kff_file_path)
-    zip_mapping = pd.read_csv(zip_mapping_path)
+    zip_mapping = load_merged_results(zip_mapping_path)
     
     print(f"\nInitial data shapes:")
     print(f"KFF data: {kff_data.shape} rows")
     print(f"ZIP mapping: {zip_mapping.shape} rows")
     
-    # Convert ZIP codes to strings with leading zeros in both dataframes
+    # Convert ZIP codes to strings with leading zeros (the mapping's are already padded)
     kff_data['Zip'] = kff_data['Zip'].astype(str).str.zfill(5)
-    zip_mapping['zip_code'] = zip_mapping['zip_code'].astype(str).str.zfill(5)
     
     # Remove duplicate ZIP code entries in mapping file
     zip_mapping_clean = zip_mapping.drop_duplicates(subset=['zip_code', 'state', 'rating_area'])
     print(f"\nAfter removing duplicates in mapping: {zip_mapping_clean.shape} rows")
     
     # Check for ZIPs that still map to multiple state/rating areas
-    zip_analysis = zip_mapping_clean.groupby('zip_code').agg({
-        'state': lambda x: list(set(x)),
-        'rating_area': lambda x: list(set(x))
-    })
-    multiple_mappings = zip_analysis[zip_analysis['state'].apply(len) > 1]
+    mapping_counts = zip_mapping_clean.groupby('zip_code')[['state', 'rating_area']].transform('nunique')
+    problems = zip_mapping_clean[(mapping_counts > 1).any(axis=1)].sort_values('zip_code')
     
-    if not multiple_mappings.empty:
+    if not problems.empty:
         print("\nAfter cleaning, still found ZIPs that map to multiple state/rating areas:")
         print("\nExample problematic ZIP codes:")
-        print(multiple_mappings.head())
-        print(f"\nTotal problematic ZIPs: {len(multiple_mappings)}")
+        print(problems[['zip_code', 'state', 'rating_area']].head().to_string(index=False))
+        print(f"\nTotal problematic ZIPs: {problems['zip_code'].nunique()}")
     
     # For ZIPs in our KFF data that have multiple mappings, show the details
-    kff_zips_with_issues = set(kff_data['Zip']).intersection(set(multiple_mappings.index))
-    if kff_zips_with_issues:
+    kff_problems = problems[problems['zip_code'].isin(kff_data['Zip'])]
+    if not kff_problems.empty:
         print("\nZIPs in our KFF data with multiple mappings:")
-        for zip_code in sorted(kff_zips_with_issues):
-            mappings = zip_mapping_clean[zip_mapping_clean['zip_code'] == zip_code]
-            print(f"\nZIP: {zip_code}")
-            print(mappings[['state', 'rating_area']].to_string())
+        print(kff_problems[['zip_code', 'state', 'rating_area']].to_string(index=False))
+    
+    # Keep one mapping per ZIP (the first listed) so a ZIP spanning several
+    # rating areas isn't counted in each of them
+    zip_mapping_unique = zip_mapping_clean.drop_duplicates(subset='zip_code', keep='first')
     
     # Merge the dataframes on ZIP code
     print("\nMerging datasets...")
     merged_data = pd.merge(
         kff_data,
-        zip_mapping_clean[['zip_code', 'state', 'rating_area']],
+        zip_mapping_unique[['zip_code', 'state', 'rating_area']],
         left_on='Zip',
         right_on='zip_code',
-        how='left'
+        how='left',
+        validate='m:1'
     )
     
     print(f"After merge: {merged_data.shape} rows")
     
-    # Convert Unsubsidized Cost to numeric, handling any string formatting
-    merged_data['Unsubsidized Cost'] = pd.to_numeric(
-        merged_data['Unsubsidized Cost'].replace(r'[\$,]', '', regex=True),
-        errors='coerce'
-    )
+    # Convert Unsubsidized Cost to numeric, stripping "$" and "," from formatted
+    # values with plain literal replaces (already-numeric columns pass through)
+    costs = merged_data['Unsubsidized Cost']
+    if not pd.api.types.is_numeric_dtype(costs):
+        costs = costs.str.replace('$', '', regex=False).str.replace(',', '', regex=False)
+    merged_data['Unsubsidized Cost'] = pd.to_numeric(costs, errors='coerce')
+    
+    # Group keys as categoricals so groupby works on integer codes
+    for col in ('state', 'rating_area'):
+        merged_data[col] = merged_data[col].astype('category')
     
     # Group by state and rating area, with additional diagnostics
+    # (observed=True: only the state/rating area pairs that actually occur)
     print("\nAggregating data...")
-    grouped = merged_data.groupby(['state', 'rating_area'])
+    grouped = merged_data.groupby(['state', 'rating_area'], observed=True)
     
     # Get counts before aggregation
     counts = grouped.size().reset_index(name='count')
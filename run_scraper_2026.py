@@ -4,70 +4,136 @@ Command-line scraper for 2026 SLSPC data
 Processes all ZIPs in zip_codes_2026.csv
 """
 import pandas as pd
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+import asyncio
 import re
+import os
 import logging
 from datetime import datetime
 
+from to_parquet import load_merged_results
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def scrape_kff_calculator(state, zip_code, age):
-    """Scrape KFF calculator for a single ZIP code"""
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        page.set_default_timeout(60000)
+# Dollar amount in the results text, e.g. "$1,234" -> "1,234"
+_COST_RE = re.compile(r"\$([\d,]+)")
+
+CALCULATOR_URL = "https://www.kff.org/interactive/calculator-aca-enhanced-premium-tax-credit/"
+
+# Number of ZIP codes scraped at the same time
+MAX_CONCURRENCY = 8
+
+# Costs that are worth scraping again on the next run
+FAILED_COSTS = ("N/A", "ERROR")
+
+# Subresources the cost extraction never looks at
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+
+async def block_unneeded(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+async def scrape_kff_calculator(context, state, zip_code, age):
+    """Scrape KFF calculator for a single ZIP code in a new page of the shared context"""
+    page = await context.new_page()
+
+    try:
+        await page.goto(CALCULATOR_URL)
+        await page.wait_for_selector("#subsidy-form", state="visible")
+
+        # Fill out the form
+        await page.select_option("#state-dd", state.lower())
+        await page.fill("input[name='zip']", zip_code)
+        await page.fill("input[name='income']", "1000000")  # Use 1 million as income
+        await page.click("#employer-coverage-0")  # Assume no employer coverage
+        await page.select_option("#number-people", "1")  # 1-person household
+
+        if state.upper() in ["NY", "VT"]:
+            await page.select_option("#number-people-alternate", "individual")
+        else:
+            # Always select 0 adults and 1 child
+            await page.select_option("#number-adults", "0")
+            await page.select_option("#number-children", "1")
+            await page.select_option("select[name='children[0][age]']", str(age))
+
+        # Submit the form
+        await page.click("input[type='submit'][value='Submit']")
+
+        # Wait for results to load
+        await page.wait_for_selector(".results-list", state="visible")
+
+        # Extract the unsubsidized cost
+        cost_text = await page.inner_text(
+            "dt:has-text('Without financial help, your silver plan would cost:') + dd"
+        )
+        match = _COST_RE.search(cost_text)
+        unsubsidized_cost = match.group(1) if match else "N/A"
+
+        return {
+            "State": state,
+            "Zip": zip_code,
+            "Age": age,
+            "Unsubsidized Cost": unsubsidized_cost,
+        }
+
+    except Exception as e:
+        logging.error(f"Error scraping ZIP {zip_code} in {state}: {str(e)}")
+        return {
+            "State": state,
+            "Zip": zip_code,
+            "Age": age,
+            "Unsubsidized Cost": "ERROR",
+        }
+
+    finally:
+        await page.close()
+
+def load_checkpoint(checkpoint_file):
+    """Results already scraped by an earlier run, keyed by ZIP code"""
+    if not os.path.exists(checkpoint_file):
+        return {}
+    df = pd.read_csv(checkpoint_file, dtype={'Zip': str, 'Unsubsidized Cost': str})
+    return {row['Zip']: row for row in df.to_dict('records')}
+
+def append_checkpoint(checkpoint_file, result):
+    """Record one successful result so a restarted run can skip it"""
+    pd.DataFrame([result]).to_csv(
+        checkpoint_file, mode='a', header=not os.path.exists(checkpoint_file), index=False
+    )
 
-        try:
-            page.goto("https://www.kff.org/interactive/calculator-aca-enhanced-premium-tax-credit/")
-            page.wait_for_selector("#subsidy-form", state="visible")
-
-            # Fill out the form
-            page.select_option("#state-dd", state.lower())
-            page.fill("input[name='zip']", zip_code)
-            page.fill("input[name='income']", "1000000")  # Use 1 million as income
-            page.click("#employer-coverage-0")  # Assume no employer coverage
-            page.select_option("#number-people", "1")  # 1-person household
-
-            if state.upper() in ["NY", "VT"]:
-                page.select_option("#number-people-alternate", "individual")
+async def scrape_all(tasks, age, checkpoint_file):
+    """Scrape (zip_code, state, rating_area) tasks in one browser, MAX_CONCURRENCY pages at a time"""
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    total = len(tasks)
+    done = 0
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        context = await browser.new_context()
+        context.set_default_timeout(60000)
+        await context.route("**/*", block_unneeded)
+
+        async def scrape_one(zip_code, state, rating_area):
+            nonlocal done
+            async with sem:
+                result = await scrape_kff_calculator(context, state, zip_code, age)
+            done += 1
+            cost = result["Unsubsidized Cost"]
+            if cost not in FAILED_COSTS:
+                append_checkpoint(checkpoint_file, result)
+            if cost == "ERROR":
+                logging.error(f"[{done}/{total}] {zip_code} ({state}, Rating Area {rating_area}) → Failed")
             else:
-                # Always select 0 adults and 1 child
-                page.select_option("#number-adults", "0")
-                page.select_option("#number-children", "1")
-                page.select_option("select[name='children[0][age]']", str(age))
-
-            # Submit the form
-            page.click("input[type='submit'][value='Submit']")
-
-            # Wait for results to load
-            page.wait_for_selector(".results-list", state="visible")
-
-            # Extract the unsubsidized cost
-            cost_text = page.inner_text(
-                "dt:has-text('Without financial help, your silver plan would cost:') + dd"
-            )
-            match = re.search(r"\$(\d+,?\d*)", cost_text)
-            unsubsidized_cost = match.group(1) if match else "N/A"
-
-            browser.close()
-
-            return {
-                "State": state,
-                "Zip": zip_code,
-                "Age": age,
-                "Unsubsidized Cost": unsubsidized_cost,
-            }
-
-        except Exception as e:
-            logging.error(f"Error scraping ZIP {zip_code} in {state}: {str(e)}")
-            browser.close()
-            return {
-                "State": state,
-                "Zip": zip_code,
-                "Age": age,
-                "Unsubsidized Cost": "ERROR",
-            }
+                logging.info(f"[{done}/{total}] {zip_code} ({state}, Rating Area {rating_area}) → Success: ${cost}")
+            return result
+
+        try:
+            # gather keeps results in task order, whatever order pages finish in
+            return await asyncio.gather(*[scrape_one(*task) for task in tasks])
+        finally:
+            await browser.close()
 
 def main():
     # Configuration
@@ -75,11 +141,12 @@ def main():
 
     # Load ZIP codes
     logging.info("Loading ZIP codes from zip_codes_2026.csv...")
-    zip_df = pd.read_csv('zip_codes_2026.csv')
+    zip_df = pd.read_csv('zip_codes_2026.csv', dtype={'zip_code': str})
+    zip_df['zip_code'] = zip_df['zip_code'].str.zfill(5)
 
     # Load merged results to get state info
     logging.info("Loading state information from merged_results_v9.csv...")
-    merged_df = pd.read_csv('merged_results_v9.csv')
+    merged_df = load_merged_results('merged_results_v9.csv', columns=['zip_code', 'state', 'rating_area'])
 
     # Merge to get state for each ZIP
     zip_with_state = zip_df.merge(
@@ -88,30 +155,37 @@ def main():
         how='left'
     )
 
-    total_zips = len(zip_with_state)
-    logging.info(f"Processing {total_zips} ZIP codes for age {AGE}...")
+    # Every ZIP in a state and rating area has the same SLSPC, so only the first
+    # ZIP of each group is scraped; ZIPs without a rating area stand alone
+    zip_with_state['rep_zip'] = (
+        zip_with_state.groupby(['state', 'rating_area'])['zip_code'].transform('first')
+        .fillna(zip_with_state['zip_code'])
+    )
+    reps = zip_with_state[zip_with_state['zip_code'] == zip_with_state['rep_zip']]
+    reps = reps.drop_duplicates(subset='zip_code')
 
-    results = []
+    # Pick up where an interrupted run left off
+    checkpoint_file = f"slspc_checkpoint_2026_age{AGE}.csv"
+    scraped = load_checkpoint(checkpoint_file)
+    reps = reps[~reps['zip_code'].isin(scraped)]
 
-    for index, row in zip_with_state.iterrows():
-        zip_code = str(row['zip_code']).zfill(5)
-        state = row['state']
-        rating_area = row['rating_area']
+    total_zips = len(zip_with_state)
+    logging.info(
+        f"Processing {total_zips} ZIP codes for age {AGE}: "
+        f"{len(reps)} to scrape, {len(scraped)} already in {checkpoint_file}"
+    )
 
-        logging.info(f"[{index+1}/{total_zips}] Processing {zip_code} ({state}, Rating Area {rating_area})")
+    # zip_code is already zero-padded above
+    tasks = list(reps[['zip_code', 'state', 'rating_area']].itertuples(index=False, name=None))
 
-        try:
-            result = scrape_kff_calculator(state, zip_code, AGE)
-            results.append(result)
-            logging.info(f"  → Success: ${result['Unsubsidized Cost']}")
-        except Exception as e:
-            logging.error(f"  → Failed: {str(e)}")
-            results.append({
-                "State": state,
-                "Zip": zip_code,
-                "Age": AGE,
-                "Unsubsidized Cost": "ERROR",
-            })
+    for result in asyncio.run(scrape_all(tasks, AGE, checkpoint_file)):
+        scraped[result['Zip']] = result
+
+    # Broadcast each group's result back to all of its ZIPs
+    results = [
+        {**scraped[rep_zip], "Zip": zip_code}
+        for zip_code, rep_zip in zip(zip_with_state['zip_code'], zip_with_state['rep_zip'])
+    ]
 
     # Save results
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -4,230 +4,422 @@ KFF Calculator Scraper - Version 2
 Uses JavaScript event dispatching to trigger form validation
 """
 
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+import asyncio
+from contextlib import AsyncExitStack
+import diskcache
+import multiprocessing as mp
 import pandas as pd
+import os
 import re
 import logging
-import time
+import sqlite3
 
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 
-def fill_field_with_events(page, selector, value, field_name):
-    """Fill a field and trigger all the events a real user would trigger"""
-    logging.info(f"  Filling {field_name}: {value}")
-
-    page.evaluate("""
-        ({selector, value}) => {
-            const el = document.querySelector(selector);
-            if (!el) throw new Error('Element not found: ' + selector);
-
-            // Focus the element
-            el.focus();
-
-            // Set the value
-            el.value = value;
-
-            // Trigger all the events
-            el.dispatchEvent(new Event('input', { bubbles: true }));
-            el.dispatchEvent(new Event('change', { bubbles: true }));
-            el.dispatchEvent(new Event('blur', { bubbles: true }));
+CALCULATOR_URL = "https://www.kff.org/interactive/calculator-aca-enhanced-premium-tax-credit/"
+
+# Number of worker processes (override with --processes=N), each scraping
+# MAX_WORKERS ZIP codes at the same time, each in its own browser context
+NUM_PROCESSES = 2
+MAX_WORKERS = 4
+
+# Pause after each ZIP, per worker, in seconds
+REQUEST_DELAY = 1
+
+# Every ZIP in a state and rating area has the same cost, so each area is only
+# scraped once; costs are kept here across runs, keyed by (state, rating_area, age)
+AREA_CACHE = 'scraped_cache.parquet'
+
+# Slim ZIP -> state/rating area lookup cut from the merged results once, and
+# rebuilt whenever the CSV is newer
+ZIP_LOOKUP_CSV = 'merged_results_v9.csv'
+ZIP_LOOKUP = 'zip_state.parquet'
+
+# Costs that mean the scrape didn't work and the area should be tried again
+FAILED_COSTS = ("ERROR", "N/A")
+
+# Each worker keeps one page and resets the form between ZIPs; the calculator
+# is reloaded every this many ZIPs to keep the page's memory in check
+RELOAD_EVERY = 25
+
+# Chromium's memory keeps growing over a long run even with every context
+# closed, so each shard relaunches its browser after this many ZIP pages
+RECYCLE_EVERY = 200
+
+# How long to wait for the form to react to a field change, in milliseconds
+FIELD_TIMEOUT = 5000
+
+# Clicks the HubSpot cookie banner's accept button as soon as it is injected,
+# so every context starts with the banner out of the way
+COOKIE_AUTO_ACCEPT_JS = """
+    new MutationObserver((_, observer) => {
+        const button = document.querySelector(
+            '#hs-eu-confirmation-button, #hs-eu-cookie-confirmation button'
+        );
+        if (button) {
+            button.click();
+            observer.disconnect();
         }
-    """, {"selector": selector, "value": value})
-    page.wait_for_timeout(300)
-
-def select_option_with_events(page, selector, value, field_name):
-    """Select an option and trigger change events"""
-    logging.info(f"  Selecting {field_name}: {value}")
+    }).observe(document, { childList: true, subtree: true });
+"""
 
-    page.evaluate("""
-        ({selector, value}) => {
+# Subresources the cost extraction never looks at; the calculator's own scripts
+# and XHRs still go through
+BLOCKED_RESOURCE_TYPES = {"image", "font", "stylesheet", "media"}
+BLOCKED_HOSTS = ("google-analytics", "googletagmanager", "doubleclick", "hotjar")
+
+# The calculator's scripts are the same for every ZIP, so their bodies are kept
+# on disk by URL and served without touching the network; the page itself and
+# the form's XHRs always go out
+STATIC_CACHE_DIR = ".kff_static_cache"
+STATIC_CACHE_TTL = 24 * 60 * 60  # 1 day, in seconds
+STATIC_RESOURCE_TYPES = {"script"}
+STATIC_HOST = "kff.org"
+static_cache = diskcache.Cache(STATIC_CACHE_DIR)
+
+# Response headers that no longer match once the body has been decoded and cached
+STRIPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+async def route_request(route):
+    """Drop unneeded requests and serve the calculator's static scripts from the cache"""
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or any(
+        host in request.url for host in BLOCKED_HOSTS
+    ):
+        await route.abort()
+        return
+
+    if (
+        request.method != "GET"
+        or request.resource_type not in STATIC_RESOURCE_TYPES
+        or STATIC_HOST not in request.url
+    ):
+        await route.continue_()
+        return
+
+    cached = static_cache.get(request.url)
+    if cached is None:
+        response = await route.fetch()
+        if not response.ok:
+            await route.fulfill(response=response)
+            return
+        cached = {
+            "status": response.status,
+            "headers": {
+                name: value for name, value in response.headers.items()
+                if name.lower() not in STRIPPED_HEADERS
+            },
+            "body": await response.body(),
+        }
+        static_cache.set(request.url, cached, expire=STATIC_CACHE_TTL)
+    await route.fulfill(**cached)
+
+# Fills the whole form in one round trip. fields is a list of {selector, value,
+# kind} in the order a user would fill them; each gets the events the form
+# listens for. Fields after the state are only enabled once the state change
+# has been handled, household fields only render after #number-people changes,
+# and select options may load late, so each field gets its own `timeout` ms of
+# animation frames to appear, be enabled and keep its value
+FILL_ALL_JS = """
+    async ({fields, timeout}) => {
+        const nextFrame = () => new Promise(resolve => requestAnimationFrame(resolve));
+        const waitFor = async (check, what, deadline) => {
+            while (!check()) {
+                if (performance.now() > deadline) throw new Error(what);
+                await nextFrame();
+            }
+        };
+
+        for (const {selector, value, kind} of fields) {
+            const deadline = performance.now() + timeout;
+            await waitFor(() => {
+                const el = document.querySelector(selector);
+                return !!el && !el.disabled;
+            }, 'Element not found or disabled: ' + selector, deadline);
             const el = document.querySelector(selector);
-            if (!el) throw new Error('Element not found: ' + selector);
-
             el.focus();
-            el.value = value;
+            if (kind === 'radio') {
+                el.click();
+            } else if (kind === 'select') {
+                // A select only keeps the value once the option exists
+                await waitFor(() => { el.value = value; return el.value === value; },
+                              'Option not available: ' + selector + ' = ' + value, deadline);
+            } else {
+                el.value = value;
+                el.dispatchEvent(new Event('input', { bubbles: true }));
+            }
             el.dispatchEvent(new Event('change', { bubbles: true }));
             el.dispatchEvent(new Event('blur', { bubbles: true }));
         }
-    """, {"selector": selector, "value": value})
-    page.wait_for_timeout(500)
-
-def click_radio_with_events(page, selector, field_name):
-    """Click a radio button with real events"""
-    logging.info(f"  Clicking {field_name}")
+        // Let the form's validation run before returning
+        await nextFrame();
+    }
+"""
 
-    page.evaluate("""
-        (selector) => {
-            const el = document.querySelector(selector);
-            if (!el) throw new Error('Element not found: ' + selector);
+# Silver plan cost in the results HTML, e.g.
+# "silver plan would cost:</dt><dd><span class="bold-blue">$1,234</span>"
+_COST_RE = re.compile(r'silver plan would cost:.*?<span[^>]*>\$([\d,]+)</span>', re.DOTALL | re.IGNORECASE)
+# Fallback: bold-blue dollar amounts, only trusted under the unsubsidized label
+# (the page highlights other amounts too, such as the subsidy)
+_BOLD_BLUE_RE = re.compile(r'class="bold-blue">\$([\d,]+)')
+UNSUBSIDIZED_LABEL = "without financial help"
+
+def find_labelled_cost(html, label=UNSUBSIDIZED_LABEL):
+    """First bold-blue amount inside the <dd> of a <dt> mentioning label, or None"""
+    for match in _BOLD_BLUE_RE.finditer(html):
+        dt_start = html.rfind("<dt", 0, match.start())
+        dt_end = html.find("</dt>", dt_start)
+        if dt_start == -1 or not 0 <= dt_end < match.start():
+            continue
+        if label in html[dt_start:dt_end].lower() and "</dd>" not in html[dt_end:match.start()]:
+            return match.group(1)
+    return None
+
+# Clears the form and the previous ZIP's costs, so the results wait and the
+# extraction only ever see the new ZIP's numbers
+RESET_FORM_JS = """
+    () => {
+        const form = document.querySelector('#subsidy-form');
+        if (!form) throw new Error('Element not found: #subsidy-form');
+        form.reset();
+        document.querySelectorAll('span.bold-blue').forEach(span => span.textContent = '');
+    }
+"""
 
-            el.focus();
-            el.click();
-            el.dispatchEvent(new Event('change', { bubbles: true }));
-        }
-    """, selector)
-    page.wait_for_timeout(300)
+# True once the results show a dollar amount
+COST_RENDERED_JS = """
+    () => [...document.querySelectorAll('span.bold-blue')]
+        .some(span => /^\\$\\d/.test(span.textContent))
+"""
 
-def scrape_kff_calculator(state, zip_code, age, headless=True):
-    """Scrape KFF calculator for a single ZIP code"""
+async def new_scrape_page(browser):
+    """Open a page in its own context, with the cookie banner and unneeded requests handled"""
+    context = await browser.new_context(
+        java_script_enabled=True,
+        viewport={"width": 800, "height": 600},
+    )
+    try:
+        await context.add_init_script(COOKIE_AUTO_ACCEPT_JS)
+        await context.route("**/*", route_request)
+        page = await context.new_page()
+        page.set_default_timeout(30000)
+    except Exception:
+        await context.close()
+        raise
+    return page
+
+async def close_quietly(page):
+    """Close a page's context, ignoring a context or browser that is already gone"""
+    if page is None:
+        return
+    try:
+        await page.context.close()
+    except Exception as e:
+        logging.debug(f"Closing a dead page failed: {e}")
+
+async def prewarm(browser):
+    """Load the calculator once in a throwaway context to fill the static script
+    cache, so the workers' first pages are served from .kff_static_cache. Chromium's
+    own HTTP cache doesn't help here: every context gets its own, and Playwright
+    turns it off whenever a route is set"""
+    page = await new_scrape_page(browser)
+    try:
+        await page.goto(CALCULATOR_URL)
+    except Exception as e:
+        logging.warning(f"Prewarm failed: {e}")
+    finally:
+        await page.context.close()
+
+async def load_calculator(page):
+    """Navigate to the calculator and get the cookie banner out of the way"""
+    # 1. Load page
+    logging.info("Step 1: Loading page...")
+    await page.goto(CALCULATOR_URL)
+    await page.wait_for_load_state("networkidle")
+
+    # 2. Wait for form
+    logging.info("Step 2: Waiting for form...")
+    await page.wait_for_selector("#subsidy-form", state="visible")
+
+    # 3. Dismiss cookie banner (normally already accepted by the init script)
+    logging.info("Step 3: Dismissing cookie banner...")
+    banner_visible = await page.locator("#hs-eu-cookie-confirmation").is_visible()
+    for attempt in range(3 if banner_visible else 0):
+        try:
+            ok_button = page.get_by_text("OK", exact=True)
+            if await ok_button.is_visible():
+                await ok_button.click(force=True)
+                await page.wait_for_selector(
+                    "#hs-eu-cookie-confirmation", state="hidden", timeout=FIELD_TIMEOUT
+                )
+                logging.info("  ✓ Cookie banner dismissed")
+                break
+        except:
+            pass
+        try:
+            await page.locator("#hs-eu-cookie-confirmation button").click(force=True)
+            await page.wait_for_selector(
+                "#hs-eu-cookie-confirmation", state="hidden", timeout=FIELD_TIMEOUT
+            )
+            logging.info("  ✓ Cookie banner dismissed")
+            break
+        except:
+            pass
+
+async def scrape_kff_calculator(page, state, zip_code, age, reload=True, debug=False):
+    """Scrape KFF calculator for a single ZIP code on a worker's page; unless reload
+    is set, the form already on the page is reset and refilled"""
 
     logging.info(f"\n{'='*60}")
     logging.info(f"Scraping: {state.upper()} {zip_code} (age {age})")
     logging.info(f"{'='*60}")
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=headless)
-        page = browser.new_page()
-        page.set_default_timeout(30000)
-
+    try:
+        if not reload:
+            try:
+                logging.info("Resetting form...")
+                await page.evaluate(RESET_FORM_JS)
+                await page.wait_for_selector("#subsidy-form", state="visible", timeout=FIELD_TIMEOUT)
+            except Exception as e:
+                logging.warning(f"  Reset failed: {e}, reloading page...")
+                reload = True
+        if reload:
+            await load_calculator(page)
+
+        # 4. Fill form with event triggering
+        logging.info("Step 4: Filling form fields...")
+
+        if age <= 20:
+            household = [
+                {"selector": "#number-adults", "value": "0", "kind": "select"},
+                {"selector": "#number-children", "value": "1", "kind": "select"},
+                {"selector": "select[name='children[0][age]']", "value": str(age), "kind": "select"},
+            ]
+        else:
+            household = [
+                {"selector": "#number-adults", "value": "1", "kind": "select"},
+                {"selector": "#number-children", "value": "0", "kind": "select"},
+                {"selector": "select[name='adults[0][age]']", "value": str(age), "kind": "select"},
+            ]
+        fields = [
+            {"selector": "#state-dd", "value": state.lower(), "kind": "select"},
+            {"selector": "input[name='zip']", "value": zip_code, "kind": "input"},
+            {"selector": "input[name='income']", "value": "1000000", "kind": "input"},
+            {"selector": "#employer-coverage-0", "value": None, "kind": "radio"},  # No employer coverage
+            {"selector": "#number-people", "value": "1", "kind": "select"},  # Household size
+        ] + household
+        logging.info(f"  State {state.lower()}, ZIP {zip_code}, income 1000000, age {age}")
+        await page.evaluate(FILL_ALL_JS, {"fields": fields, "timeout": FIELD_TIMEOUT})
+
+        # 5. Wait for any async validation
+        logging.info("Step 5: Waiting for validation...")
+        await page.wait_for_load_state("networkidle")
         try:
-            # 1. Load page
-            logging.info("Step 1: Loading page...")
-            page.goto("https://www.kff.org/interactive/calculator-aca-enhanced-premium-tax-credit/")
-            page.wait_for_load_state("networkidle")
-
-            # 2. Wait for form
-            logging.info("Step 2: Waiting for form...")
-            page.wait_for_selector("#subsidy-form", state="visible")
-
-            # 3. Dismiss cookie banner
-            logging.info("Step 3: Dismissing cookie banner...")
-            page.wait_for_timeout(1000)
-            for attempt in range(3):
-                try:
-                    ok_button = page.get_by_text("OK", exact=True)
-                    if ok_button.is_visible():
-                        ok_button.click(force=True)
-                        page.wait_for_timeout(500)
-                        logging.info("  ✓ Cookie banner dismissed")
-                        break
-                except:
-                    pass
-                try:
-                    page.locator("#hs-eu-cookie-confirmation button").click(force=True)
-                    page.wait_for_timeout(500)
-                    logging.info("  ✓ Cookie banner dismissed")
-                    break
-                except:
-                    pass
-
-            # 4. Fill form with event triggering
-            logging.info("Step 4: Filling form fields...")
-
-            # State
-            select_option_with_events(page, "#state-dd", state.lower(), "State")
-            page.wait_for_load_state("networkidle")
-
-            # ZIP code
-            fill_field_with_events(page, "input[name='zip']", zip_code, "ZIP")
-
-            # Income
-            fill_field_with_events(page, "input[name='income']", "1000000", "Income")
-
-            # Employer coverage (No)
-            click_radio_with_events(page, "#employer-coverage-0", "Employer coverage: No")
-
-            # Household size
-            select_option_with_events(page, "#number-people", "1", "Household size")
-            page.wait_for_timeout(1000)  # Wait for adult/child fields to appear
-
-            # Handle age based on adult vs child
-            if age <= 20:
-                select_option_with_events(page, "#number-adults", "0", "Adults")
-                select_option_with_events(page, "#number-children", "1", "Children")
-                page.wait_for_timeout(500)
-                select_option_with_events(page, "select[name='children[0][age]']", str(age), "Child age")
-            else:
-                select_option_with_events(page, "#number-adults", "1", "Adults")
-                select_option_with_events(page, "#number-children", "0", "Children")
-                page.wait_for_timeout(500)
-                select_option_with_events(page, "select[name='adults[0][age]']", str(age), "Adult age")
-
-            # 5. Wait for any async validation
-            logging.info("Step 5: Waiting for validation...")
-            page.wait_for_load_state("networkidle")
-            page.wait_for_timeout(1000)
-
-            # 6. Check submit button status
-            logging.info("Step 6: Checking submit button...")
-            submit_disabled = page.evaluate("""
-                () => {
-                    const btn = document.querySelector('input[type="submit"][value="Submit"]');
-                    return btn ? btn.disabled : true;
-                }
-            """)
-
-            logging.info(f"  Submit button disabled: {submit_disabled}")
-
-            # 7. Submit the form
-            logging.info("Step 7: Submitting form...")
-
-            # First, try clicking if it's enabled
-            if not submit_disabled:
-                try:
-                    page.locator("input[type='submit'][value='Submit']").click(timeout=5000)
-                    logging.info("  ✓ Clicked submit button")
-                except Exception as e:
-                    logging.warning(f"  Click failed: {e}, trying JS submit...")
-                    page.evaluate("document.querySelector('#subsidy-form').requestSubmit()")
-            else:
-                # Force submit via JavaScript
-                logging.info("  Button disabled, forcing submit via JS...")
-                page.evaluate("document.querySelector('#subsidy-form').requestSubmit()")
-
-            # 8. Wait for results
-            logging.info("Step 8: Waiting for results...")
-            page.wait_for_selector("text=Your cost for a silver plan", state="visible", timeout=20000)
-            logging.info("  ✓ Results loaded!")
-
-            # 9. Extract data
+            await page.wait_for_function(
+                "() => !document.querySelector(\"input[type='submit'][value='Submit']\")?.disabled",
+                timeout=FIELD_TIMEOUT,
+            )
+        except Exception:
+            pass  # Still disabled; step 7 falls back to a JS submit
+
+        # 6. Check submit button status
+        logging.info("Step 6: Checking submit button...")
+        submit_disabled = await page.evaluate("""
+            () => {
+                const btn = document.querySelector('input[type="submit"][value="Submit"]');
+                return btn ? btn.disabled : true;
+            }
+        """)
+
+        logging.info(f"  Submit button disabled: {submit_disabled}")
+
+        # 7. Submit the form
+        logging.info("Step 7: Submitting form...")
+
+        # First, try clicking if it's enabled
+        if not submit_disabled:
+            try:
+                await page.locator("input[type='submit'][value='Submit']").click(timeout=5000)
+                logging.info("  ✓ Clicked submit button")
+            except Exception as e:
+                logging.warning(f"  Click failed: {e}, trying JS submit...")
+                await page.evaluate("document.querySelector('#subsidy-form').requestSubmit()")
+        else:
+            # Force submit via JavaScript
+            logging.info("  Button disabled, forcing submit via JS...")
+            await page.evaluate("document.querySelector('#subsidy-form').requestSubmit()")
+
+        # 8. Wait for results
+        logging.info("Step 8: Waiting for results...")
+        await page.wait_for_selector("text=Your cost for a silver plan", state="visible", timeout=20000)
+        await page.wait_for_function(COST_RENDERED_JS, timeout=20000)
+        logging.info("  ✓ Results loaded!")
+
+        # 9. Extract data
+        if debug:
             # Save HTML for debugging
-            import os
             debug_dir = f"/tmp/debug_{zip_code}"
             os.makedirs(debug_dir, exist_ok=True)
             with open(f"{debug_dir}/results_page.html", "w") as f:
-                f.write(page.content())
+                f.write(await page.content())
             logging.info(f"  Saved results HTML to {debug_dir}/results_page.html")
 
-            cost = extract_unsubsidized_cost(page)
-            logging.info(f"  → Unsubsidized cost: ${cost}")
-
-            browser.close()
+        cost = await extract_unsubsidized_cost(page)
+        logging.info(f"  → Unsubsidized cost: ${cost}")
 
-            return {
-                "State": state.upper(),
-                "Zip": zip_code,
-                "Age": age,
-                "Unsubsidized Cost": cost,
-            }
+        return {
+            "State": state.upper(),
+            "Zip": zip_code,
+            "Age": age,
+            "Unsubsidized Cost": cost,
+        }
 
-        except Exception as e:
-            logging.error(f"ERROR: {str(e)}")
-            browser.close()
-            return {
-                "State": state.upper(),
-                "Zip": zip_code,
-                "Age": age,
-                "Unsubsidized Cost": "ERROR",
-            }
+    except Exception as e:
+        logging.error(f"ERROR: {str(e)}")
+        return {
+            "State": state.upper(),
+            "Zip": zip_code,
+            "Age": age,
+            "Unsubsidized Cost": "ERROR",
+        }
 
-def extract_unsubsidized_cost(page):
+async def extract_unsubsidized_cost(page):
     """Extract the unsubsidized silver plan cost from results"""
 
     logging.info("Extracting cost from results page...")
 
-    # Strategy 1: Look for bold-blue span with dollar amount near "silver plan"
+    # Strategies 1 and 2: search the page HTML, one round trip for both
+    try:
+        html = await page.content()
+        # Find: "silver plan would cost:</dt><dd><span class="bold-blue">$XXX</span>"
+        match = _COST_RE.search(html)
+        if match:
+            cost = match.group(1).replace(",", "")
+            logging.info(f"  Found cost in HTML: ${cost}")
+            return cost
+
+        # Otherwise a bold-blue amount under the "Without financial help" label
+        cost = find_labelled_cost(html)
+        if cost:
+            cost = cost.replace(",", "")
+            logging.warning(f"  Using amount labelled 'Without financial help': ${cost}")
+            return cost
+    except Exception as e:
+        logging.error(f"  Failed HTML search: {e}")
+
+    # Strategy 3: Look for bold-blue span with dollar amount near "silver plan"
     try:
         # Get all bold-blue spans
-        spans = page.locator("span.bold-blue").all()
+        spans = await page.locator("span.bold-blue").all()
         logging.info(f"  Found {len(spans)} bold-blue spans")
 
         for span in spans:
-            text = span.inner_text()
+            text = await span.inner_text()
             # Look for dollar amounts
             if text.startswith("$") and re.match(r"\$\d+", text):
                 # Check if this is near "silver plan" text
-                parent_text = span.evaluate("el => el.closest('dd').previousElementSibling.innerText")
+                parent_text = await span.evaluate("el => el.closest('dd').previousElementSibling.innerText")
                 if "silver plan" in parent_text.lower():
                     cost = text.replace("$", "").replace(",", "")
                     logging.info(f"  Found silver plan cost: ${cost}")
@@ -235,124 +427,301 @@ def extract_unsubsidized_cost(page):
     except Exception as e:
         logging.error(f"  Failed span search: {e}")
 
-    # Strategy 2: Search full HTML for the pattern
-    try:
-        html = page.content()
-        # Find: "silver plan would cost:</dt><dd><span class="bold-blue">$XXX</span>"
-        match = re.search(r'silver plan would cost:.*?<span[^>]*>\$(\d+,?\d*)</span>', html, re.DOTALL | re.IGNORECASE)
-        if match:
-            cost = match.group(1).replace(",", "")
-            logging.info(f"  Found cost in HTML: ${cost}")
-            return cost
-    except Exception as e:
-        logging.error(f"  Failed HTML search: {e}")
+    return "N/A"
 
-    # Strategy 3: Just get the first bold-blue dollar amount
-    try:
-        spans = page.locator("span.bold-blue").all()
-        for span in spans:
-            text = span.inner_text()
-            if text.startswith("$"):
-                cost = text.replace("$", "").replace(",", "")
-                logging.warning(f"  Using first dollar amount found: ${cost}")
-                return cost
-    except Exception as e:
-        logging.error(f"  Failed fallback search: {e}")
+def open_results_db(db_path):
+    """Results store shared by all worker processes; WAL lets them write concurrently"""
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS results (zip TEXT PRIMARY KEY, state TEXT, age INTEGER, cost TEXT)"
+    )
+    # Rating area costs found this run, so they survive a shard that crashes later
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS area_costs "
+        "(state TEXT, rating_area TEXT, age INTEGER, cost TEXT, PRIMARY KEY (state, rating_area, age))"
+    )
+    return conn
+
+def save_results(conn, results, overwrite=False):
+    """Record result rows; a ZIP that already has a row keeps it unless overwrite is set"""
+    on_conflict = (
+        "ON CONFLICT(zip) DO UPDATE SET state = excluded.state, age = excluded.age, cost = excluded.cost"
+        if overwrite else "ON CONFLICT(zip) DO NOTHING"
+    )
+    conn.executemany(
+        f"INSERT INTO results (zip, state, age, cost) VALUES (?, ?, ?, ?) {on_conflict}",
+        [(r["Zip"], r["State"], r["Age"], str(r["Unsubsidized Cost"])) for r in results],
+    )
+
+def save_area_cost(conn, state, rating_area, age, cost):
+    conn.execute(
+        "INSERT OR REPLACE INTO area_costs (state, rating_area, age, cost) VALUES (?, ?, ?, ?)",
+        (state, rating_area, age, str(cost)),
+    )
+
+def read_area_costs(conn):
+    """Rating area costs recorded by any shard, as {(state, rating_area, age): cost}"""
+    rows = conn.execute("SELECT state, rating_area, age, cost FROM area_costs")
+    return {(state, rating_area, age): cost for state, rating_area, age, cost in rows}
+
+def read_results(conn):
+    """All recorded results as a DataFrame with the CSV's columns"""
+    return pd.read_sql(
+        'SELECT state AS "State", zip AS "Zip", age AS "Age", cost AS "Unsubsidized Cost" '
+        "FROM results ORDER BY rowid",
+        conn,
+    )
+
+def read_done_zips(conn):
+    """ZIPs that already have a cost; rows that failed (FAILED_COSTS) are scraped again"""
+    placeholders = ", ".join("?" * len(FAILED_COSTS))
+    rows = conn.execute(f"SELECT zip FROM results WHERE cost NOT IN ({placeholders})", FAILED_COSTS)
+    return {zip_code for (zip_code,) in rows}
+
+def plan_jobs(df, conn, done_zips, zip_to_state, zip_to_area, area_costs, age):
+    """Jobs for the rows of df that still need scraping; ZIPs whose rating area cost is
+    already known are recorded straight away instead"""
+    total = len(df)
+    # Work out which rows still need scraping before any browser work starts:
+    # one job per rating area, with the area's other ZIPs riding along
+    areas = {}  # (state, rating_area) -> [idx, state, first ZIP, other ZIPs]
+    jobs = []
+    for idx, row in df.iterrows():
+        zip_code = str(row['zip_code']).zfill(5)
 
-    return "N/A"
+        # Skip if already processed
+        if zip_code in done_zips:
+            print(f"[{idx+1}/{total}] Skipping {zip_code} (already processed)")
+            continue
+
+        # Get state from row if available, otherwise look it up
+        if 'state' in row and pd.notna(row['state']):
+            state = row['state']
+        elif pd.notna(zip_to_state.get(zip_code)):
+            state = zip_to_state.get(zip_code)
+        else:
+            print(f"WARNING: Could not find state for ZIP {zip_code}, skipping...")
+            continue
+
+        rating_area = zip_to_area.get(zip_code)
+        if rating_area is None:
+            # Unknown rating area, so nothing to share with
+            jobs.append((idx, state, zip_code, None, [], []))
+            continue
+
+        cost = area_costs.get((state.upper(), rating_area, age))
+        if cost is not None:
+            print(f"[{idx+1}/{total}] {zip_code}: cached cost for {state.upper()} rating area {rating_area}")
+            save_results(
+                conn,
+                [{"State": state.upper(), "Zip": zip_code, "Age": age, "Unsubsidized Cost": cost}],
+                overwrite=True,
+            )
+        elif (state.upper(), rating_area) in areas:
+            areas[(state.upper(), rating_area)][3].append(zip_code)
+        else:
+            areas[(state.upper(), rating_area)] = [idx, state, zip_code, []]
+
+    for (_, rating_area), (idx, state, zip_code, followers) in areas.items():
+        jobs.append((idx, state, zip_code, rating_area, followers, []))
+
+    return jobs
+
+def load_zip_lookup(csv_path=ZIP_LOOKUP_CSV, path=ZIP_LOOKUP):
+    """State and rating area of every ZIP, indexed by zero-padded zip_code"""
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(csv_path):
+        lookup = pd.read_csv(
+            csv_path,
+            usecols=['zip_code', 'state', 'rating_area'],
+            dtype={'zip_code': 'string', 'state': 'category', 'rating_area': 'string'},
+        )
+        lookup['zip_code'] = lookup['zip_code'].str.zfill(5)
+        lookup.drop_duplicates('zip_code').to_parquet(path, index=False)
+    return pd.read_parquet(path, memory_map=True).set_index('zip_code')
+
+def load_area_cache(path=AREA_CACHE):
+    """Costs scraped by earlier runs, as {(state, rating_area, age): cost}"""
+    if not os.path.exists(path):
+        return {}
+    cache_df = pd.read_parquet(path)
+    return {
+        (state, rating_area, age): cost
+        for state, rating_area, age, cost in cache_df.itertuples(index=False, name=None)
+    }
+
+def save_area_cache(area_costs, path=AREA_CACHE):
+    cache_df = pd.DataFrame(
+        [(*key, cost) for key, cost in area_costs.items()],
+        columns=['state', 'rating_area', 'age', 'cost'],
+    )
+    cache_df.to_parquet(path, index=False)
+
+async def scrape_all(jobs, age, total, db_path, headless=True, cdp_endpoint=None, debug=False):
+    """Work through (idx, state, zip_code, rating_area, followers, failed) jobs with MAX_WORKERS
+    concurrent workers; each result is copied to the follower ZIPs of the same rating area,
+    and to the area's ZIPs that failed earlier"""
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+    conn = open_results_db(db_path)
+
+    async def scrape_job(page, job, reload):
+        idx, state, zip_code, rating_area, followers, failed = job
+        print(f"\n[{idx+1}/{total}] Processing {state.upper()} {zip_code}...")
+        result = await scrape_kff_calculator(page, state, zip_code, age, reload, debug)
+
+        if result["Unsubsidized Cost"] in FAILED_COSTS and followers:
+            # Give the rating area another chance with its next ZIP; this ZIP's
+            # ERROR row is replaced once the area resolves
+            queue.put_nowait((idx, state, followers[0], rating_area, followers[1:], failed + [zip_code]))
+            group = [result]
+        else:
+            group = [result] + [{**result, "Zip": other} for other in failed + followers]
+            if rating_area is not None and result["Unsubsidized Cost"] not in FAILED_COSTS:
+                save_area_cost(conn, state.upper(), rating_area, age, result["Unsubsidized Cost"])
+
+        # Save progress after every ZIP
+        save_results(conn, group, overwrite=True)
+        return result
+
+    pages_since_launch = 0
+
+    async def worker(browser, warmup):
+        # One page for the worker's lifetime; it is reloaded every RELOAD_EVERY
+        # ZIPs and after a failed scrape, otherwise only the form is reset.
+        # The worker stops once the browser is due for a relaunch
+        nonlocal pages_since_launch
+        page = await new_scrape_page(browser)
+        scraped = 0
+        try:
+            await warmup
+            while pages_since_launch < RECYCLE_EVERY:
+                try:
+                    job = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                pages_since_launch += 1
+                result = await scrape_job(page, job, scraped % RELOAD_EVERY == 0)
+                scraped += 1
+
+                if result["Unsubsidized Cost"] == "ERROR":
+                    # The page or its context may have crashed; start over in a fresh one
+                    await close_quietly(page)
+                    page = None
+                    page = await new_scrape_page(browser)
+                    scraped = 0
+
+                await asyncio.sleep(REQUEST_DELAY)  # Be nice to the server
+        finally:
+            await close_quietly(page)
+
+    # One page per worker, in a browser that is relaunched every RECYCLE_EVERY
+    # pages. With a CDP endpoint (see start_daemon.py) the already-running
+    # browser is reused and only the connection is renewed
+    async with AsyncExitStack() as stack:
+        stack.callback(conn.close)
+        p = await stack.enter_async_context(async_playwright())
+        while not queue.empty():
+            async with AsyncExitStack() as browser_stack:
+                if cdp_endpoint:
+                    browser = await p.chromium.connect_over_cdp(cdp_endpoint)
+                else:
+                    browser = await p.chromium.launch(headless=headless)
+                browser_stack.push_async_callback(browser.close)
+                pages_since_launch = 0
+
+                # Workers open their pages while the prewarm runs, then wait for it
+                warmup = asyncio.create_task(prewarm(browser))
+                browser_stack.push_async_callback(asyncio.wait, [warmup])
+                await asyncio.gather(*[worker(browser, warmup) for _ in range(MAX_WORKERS)])
+            if not queue.empty():
+                logging.info(f"Relaunching browser after {pages_since_launch} pages...")
+
+def scrape_shard(jobs, age, total, db_path, headless=True, cdp_endpoint=None, debug=False):
+    """Entry point of a worker process: scrape one slice of the jobs into the shared store"""
+    asyncio.run(scrape_all(jobs, age, total, db_path, headless, cdp_endpoint, debug))
 
 def main():
     import sys
-    import os
 
     if len(sys.argv) < 2:
-        print("Usage: python scraper_v2.py <csv_file> [--visible]")
+        print("Usage: python scraper_v2.py <csv_file> [--visible] [--debug] [--processes=<n>] [--cdp-endpoint=<url>]")
         print("Example: python scraper_v2.py zip_codes_test_5.csv")
+        print("Example: python scraper_v2.py zip_codes_test_5.csv --cdp-endpoint=http://127.0.0.1:9222")
         sys.exit(1)
 
     csv_file = sys.argv[1]
     headless = "--visible" not in sys.argv
+    debug = "--debug" in sys.argv  # Save each results page to /tmp/debug_<zip>
+    cdp_endpoint = next((a.split("=", 1)[1] for a in sys.argv if a.startswith("--cdp-endpoint=")), None)
+    processes = int(next((a.split("=", 1)[1] for a in sys.argv if a.startswith("--processes=")), NUM_PROCESSES))
 
-    # Read ZIP codes
-    df = pd.read_csv(csv_file)
+    # Read ZIP codes (and states, when the file has them)
+    df = pd.read_csv(
+        csv_file, usecols=lambda c: c in ('zip_code', 'state'), dtype={'zip_code': 'string'}
+    )
 
     # Load state lookup from merged_results_v9.csv
-    print("Loading state lookup from merged_results_v9.csv...")
-    merged_df = pd.read_csv('merged_results_v9.csv')
-    merged_df['zip_code'] = merged_df['zip_code'].astype(str).str.zfill(5)
-    zip_to_state = merged_df.groupby('zip_code')['state'].first().to_dict()
+    print(f"Loading state lookup from {ZIP_LOOKUP}...")
+    zip_info = load_zip_lookup()
+    zip_to_state = zip_info['state']
+    zip_to_area = zip_info['rating_area'].dropna()
 
     age = 0
-    results = []
     total = len(df)
 
     print(f"\n{'='*60}")
     print(f"Starting scrape of {total} ZIP codes")
-    print(f"Mode: {'HEADLESS' if headless else 'VISIBLE'}")
+    print(f"Mode: {'CDP ' + cdp_endpoint if cdp_endpoint else 'HEADLESS' if headless else 'VISIBLE'}")
     print(f"{'='*60}\n")
 
     output_file = csv_file.replace('.csv', '_results.csv')
+    db_path = csv_file.replace('.csv', '_results.db')
 
-    # Check if results file exists (for resume)
+    # Results go to SQLite while scraping and are dumped to the CSV at the end;
+    # rows from an existing CSV are carried over so nothing is lost on resume
+    conn = open_results_db(db_path)
     if os.path.exists(output_file):
-        existing_df = pd.read_csv(output_file)
-        existing_zips = set(existing_df['Zip'].astype(str).str.zfill(5))
-        print(f"Found existing results file with {len(existing_zips)} ZIPs already processed")
+        existing_df = pd.read_csv(output_file, dtype=str)
+        existing_df['Zip'] = existing_df['Zip'].str.zfill(5)
+        save_results(conn, existing_df.to_dict('records'))
+
+    # Check for already processed ZIPs (for resume)
+    existing_zips = read_done_zips(conn)
+    if existing_zips:
+        print(f"Found existing results with {len(existing_zips)} ZIPs already processed")
         print(f"Resuming from where we left off...\n")
-    else:
-        existing_zips = set()
 
-    for idx, row in df.iterrows():
-        zip_code = str(row['zip_code']).zfill(5)
+    area_costs = load_area_cache()
+    jobs = plan_jobs(df, conn, existing_zips, zip_to_state, zip_to_area, area_costs, age)
 
-        # Skip if already processed
-        if zip_code in existing_zips:
-            print(f"[{idx+1}/{total}] Skipping {zip_code} (already processed)")
-            continue
-
-        # Get state from row if available, otherwise look it up
-        if 'state' in row and pd.notna(row['state']):
-            state = row['state']
-        elif zip_code in zip_to_state:
-            state = zip_to_state[zip_code]
-        else:
-            print(f"WARNING: Could not find state for ZIP {zip_code}, skipping...")
-            continue
-
-        print(f"\n[{idx+1}/{total}] Processing {state.upper()} {zip_code}...")
-
-        result = scrape_kff_calculator(state, zip_code, age, headless=headless)
-        results.append(result)
-
-        # Save progress after every ZIP (incremental save)
-        results_df = pd.DataFrame(results)
-        if os.path.exists(output_file):
-            # Append to existing
-            existing_df = pd.read_csv(output_file)
-            combined_df = pd.concat([existing_df, results_df], ignore_index=True)
-            combined_df.to_csv(output_file, index=False)
-        else:
-            # Create new
-            results_df.to_csv(output_file, index=False)
-
-        results = []  # Clear for next iteration
-
-        time.sleep(1)  # Be nice to the server
-
-    # Final save (in case there are any remaining)
-    if results:
-        results_df = pd.DataFrame(results)
-        if os.path.exists(output_file):
-            existing_df = pd.read_csv(output_file)
-            combined_df = pd.concat([existing_df, results_df], ignore_index=True)
-            combined_df.to_csv(output_file, index=False)
+    print(f"{len(jobs)} pages to scrape for {total} ZIP codes\n")
+    # Each process gets every n-th job; a rating area's ZIPs all travel in one job,
+    # so shards never scrape the same area twice
+    shards = [
+        (jobs[i::processes], age, total, db_path, headless, cdp_endpoint, debug)
+        for i in range(processes)
+    ]
+    try:
+        if processes == 1:
+            scrape_shard(*shards[0])
         else:
-            results_df.to_csv(output_file, index=False)
+            with mp.get_context("spawn").Pool(processes=processes) as pool:
+                pool.starmap(scrape_shard, shards)
+    finally:
+        # Shards record area costs as they find them, so a crashed shard loses
+        # none of the others' work
+        area_costs.update(read_area_costs(conn))
+        save_area_cache(area_costs)
+        results = read_results(conn)
+        conn.close()
+        results.to_csv(output_file, index=False)
 
     print(f"\n{'='*60}")
     print(f"COMPLETE! Results saved to: {output_file}")
     print(f"{'='*60}\n")
-    print(results_df)
+    print(results)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Keep one headless Chromium running with remote debugging enabled
+Scrapers attach to it with --cdp-endpoint instead of launching their own browser
+"""
+
+from playwright.sync_api import sync_playwright
+import json
+import subprocess
+import sys
+import time
+import urllib.request
+
+DEBUG_PORT = 9222
+PROFILE_DIR = "/tmp/kff-profile"
+
+# How long to wait for the DevTools endpoint to come up, in seconds
+STARTUP_TIMEOUT = 15
+
+def chromium_path():
+    """Path to the Chromium build Playwright installed"""
+    with sync_playwright() as p:
+        return p.chromium.executable_path
+
+def wait_for_endpoint(port):
+    """Poll the DevTools endpoint until Chromium answers; returns its version info"""
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/json/version") as response:
+                return json.load(response)
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Chromium did not open port {port} within {STARTUP_TIMEOUT}s")
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEBUG_PORT
+
+    proc = subprocess.Popen([
+        chromium_path(),
+        f"--remote-debugging-port={port}",
+        "--headless=new",
+        f"--user-data-dir={PROFILE_DIR}",
+        "--no-first-run",
+        "--no-default-browser-check",
+    ])
+
+    try:
+        info = wait_for_endpoint(port)
+        print(f"Chromium {info.get('Browser')} listening on {info.get('webSocketDebuggerUrl')}")
+        print(f"Run: python scraper_v2.py <csv_file> --cdp-endpoint=http://127.0.0.1:{port}")
+        print("Press Ctrl+C to stop")
+        proc.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proc.terminate()
+        proc.wait()
+
+if __name__ == "__main__":
+    main()
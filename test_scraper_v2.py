@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("playwright")
+
+import scraper_v2
+
+
+def test_failed_area_is_retried_on_resume(tmp_path):
+    conn = scraper_v2.open_results_db(str(tmp_path / "results.db"))
+    # A previous run scraped one rating area and failed on the other
+    scraper_v2.save_results(conn, [
+        {"State": "CA", "Zip": "90001", "Age": 0, "Unsubsidized Cost": 350},
+        {"State": "CA", "Zip": "94101", "Age": 0, "Unsubsidized Cost": "ERROR"},
+        {"State": "CA", "Zip": "94102", "Age": 0, "Unsubsidized Cost": "ERROR"},
+    ])
+
+    done = scraper_v2.read_done_zips(conn)
+    assert done == {"90001"}
+
+    df = pd.DataFrame({"zip_code": ["90001", "94101", "94102"], "state": ["CA"] * 3})
+    zip_to_area = pd.Series({"90001": "15", "94101": "4", "94102": "4"})
+    jobs = scraper_v2.plan_jobs(df, conn, done, pd.Series(dtype=object), zip_to_area, {}, 0)
+
+    # The failed area goes back to the scraper as one job, the done ZIP does not
+    assert jobs == [(1, "CA", "94101", "4", ["94102"], [])]
+    conn.close()
+
+
+def test_cached_area_cost_replaces_failed_row(tmp_path):
+    conn = scraper_v2.open_results_db(str(tmp_path / "results.db"))
+    scraper_v2.save_results(conn, [{"State": "CA", "Zip": "94101", "Age": 0, "Unsubsidized Cost": "N/A"}])
+
+    df = pd.DataFrame({"zip_code": ["94101"], "state": ["CA"]})
+    jobs = scraper_v2.plan_jobs(
+        df, conn, scraper_v2.read_done_zips(conn), pd.Series(dtype=object),
+        pd.Series({"94101": "4"}), {("CA", "4", 0): "412"}, 0,
+    )
+
+    assert jobs == []
+    assert scraper_v2.read_results(conn)["Unsubsidized Cost"].tolist() == ["412"]
+    conn.close()
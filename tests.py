@@ -3,7 +3,9 @@ import numpy as np
 
 # Load the datasets
 scraped = pd.read_csv('/Users/daphnehansell/Documents/GitHub/slspc/zip_30_amount - scraped_SLSPC.csv')
-merged = pd.read_csv('/Users/daphnehansell/Documents/GitHub/slspc/merged_results_with_slspc.csv')
+merged = pd.read_csv('/Users/daphnehansell/Documents/GitHub/slspc/merged_results_with_slspc.csv',
+                     dtype={'zip_code': str})
+merged['zip_code'] = merged['zip_code'].str.zfill(5)
 
 # 1. Consistency Check
 rating_area_counts = merged.groupby(['state', 'rating_area'])['slspc'].nunique()
@@ -12,14 +14,19 @@ print("Rating areas with multiple SLSPC values:")
 print(inconsistent_areas if len(inconsistent_areas) > 0 else "None found")
 
 # 2. Original Data Verification
-scraped['Zip'] = scraped['Zip'].astype(str).str.zfill(5)
-scraped['Unsubsidized Cost'] = scraped['Unsubsidized Cost'].str.replace(',', '').astype(float)
-original_vs_merged = merged[merged['zip_code'].isin(scraped['Zip'])]
-original_values = dict(zip(scraped['Zip'], scraped['Unsubsidized Cost']))
-original_vs_merged['original_value'] = original_vs_merged['zip_code'].map(original_values)
-mismatches = original_vs_merged[original_vs_merged['slspc'] != original_vs_merged['original_value']]
+original_values = pd.DataFrame({
+    'zip_code': scraped['Zip'].astype(str).str.zfill(5),
+    'original_value': pd.to_numeric(
+        scraped['Unsubsidized Cost'].astype(str).str.replace(',', '', regex=False), errors='coerce'
+    ),
+}).drop_duplicates('zip_code', keep='last')  # Last scrape wins, as the old dict lookup did
+original_vs_merged = merged.merge(original_values, on='zip_code', how='inner', validate='m:1')
+mismatches = original_vs_merged.loc[
+    original_vs_merged['slspc'].ne(original_vs_merged['original_value']),
+    ['zip_code', 'slspc', 'original_value'],
+]
 print("\nMismatched values between original and merged:")
-print(mismatches[['zip_code', 'slspc', 'original_value']] if len(mismatches) > 0 else "None found")
+print(mismatches if len(mismatches) > 0 else "None found")
 
 # 3. Missing Value Check
 missing_values = merged[merged['slspc'].isna()]
@@ -34,11 +41,9 @@ print("\nSummary statistics by state:")
 print(state_stats)
 
 # 5. Check for extreme outliers within states
-def find_outliers(group):
-    mean = group['slspc'].mean()
-    std = group['slspc'].std()
-    return group[abs(group['slspc'] - mean) > 3 * std]
-
-outliers = merged.groupby('state').apply(find_outliers)
+state_slspc = merged.groupby('state')['slspc']
+state_mean = state_slspc.transform('mean')
+state_std = state_slspc.transform('std')
+outliers = merged[(merged['slspc'] - state_mean).abs() > 3 * state_std]
 print("\nOutliers (>3 std from state mean):")
 print(outliers[['state', 'rating_area', 'zip_code', 'slspc']] if len(outliers) > 0 else "None found")
\ No newline at end of file
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Convert merged_results_v9.csv to Parquet for the downstream scripts
+ZIP codes and ZIP3s are stored zero-padded and rating areas as strings, so readers skip the cleanup
+"""
+from pathlib import Path
+
+import pandas as pd
+
+MERGED_RESULTS_CSV = 'merged_results_v9.csv'
+
+def convert_to_parquet(input_csv, output_parquet):
+    df = pd.read_csv(input_csv, dtype={'zip_code': 'string', 'ZIP3': 'string', 'rating_area': 'string'})
+
+    # ZIPs like 00501 lose their leading zeros in the CSV
+    df['zip_code'] = df['zip_code'].str.zfill(5)
+
+    df.to_parquet(output_parquet, index=False, compression='zstd')
+    return df
+
+def load_merged_results(csv_path=MERGED_RESULTS_CSV, columns=None):
+    """Read the merged results from their Parquet copy next to the CSV, (re)building
+    it first when it is missing or older than the CSV"""
+    parquet_path = Path(csv_path).with_suffix('.parquet')
+    if not parquet_path.exists() or parquet_path.stat().st_mtime < Path(csv_path).stat().st_mtime:
+        convert_to_parquet(csv_path, parquet_path)
+    return pd.read_parquet(parquet_path, columns=columns)
+
+if __name__ == "__main__":
+    input_path = MERGED_RESULTS_CSV
+    output_path = "merged_results_v9.parquet"
+
+    result = convert_to_parquet(input_path, output_path)
+    print(f"Saved {len(result)} rows to {output_path}")
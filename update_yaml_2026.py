@@ -3,23 +3,23 @@
 Update state_rating_area_cost.yaml with 2026 SLCSP premiums
 """
 
+import datetime
 import pandas as pd
-import yaml
-from collections import OrderedDict
+from ruamel.yaml import YAML
 
-# Preserve YAML order and formatting
-def represent_ordereddict(dumper, data):
-    return dumper.represent_mapping('tag:yaml.org,2002:map', data.items())
+# Round-trip mode keeps the file's order, comments and header as they are
+yaml = YAML()
+yaml.preserve_quotes = True
+yaml.indent(mapping=2, sequence=4, offset=2)
 
-yaml.add_representer(OrderedDict, represent_ordereddict)
-
-# Custom float formatter to always show .00
-def float_representer(dumper, value):
-    return dumper.represent_scalar('tag:yaml.org,2002:float', f'{value:.2f}')
-
-yaml.add_representer(float, float_representer)
+# New costs are written with two decimals (.00); values already in the file keep their format
+yaml.representer.add_representer(
+    float, lambda dumper, value: dumper.represent_scalar('tag:yaml.org,2002:float', f'{value:.2f}')
+)
 
-# Don't add custom string representer - will handle dates differently
+# Unquoted date keys load as datetime.date, so the new key has to be one too;
+# a fresh date per area, since a shared object would be dumped as a YAML alias
+DATE_2026 = '2026-01-01'
 
 print("Loading scraped results...")
 results = pd.read_csv('zip_codes_2026_results.csv')
@@ -46,7 +46,14 @@ df['Unsubsidized Cost'] = pd.to_numeric(df['Unsubsidized Cost'], errors='coerce'
 
 # Group by state and rating area - take the first cost for each area
 print("Grouping by state and rating area...")
-slspc_2026 = df.groupby(['State', 'rating_area'])['Unsubsidized Cost'].first().to_dict()
+slspc_2026 = df.groupby(['State', 'rating_area'])['Unsubsidized Cost'].first().reset_index()
+
+# The YAML has integer keys (1, 2, 3) for numeric areas and string keys for
+# alphanumeric ones (e.g. ME has '3N', '3S'), so numeric strings become ints
+numeric_area = pd.to_numeric(slspc_2026['rating_area'], errors='coerce')
+slspc_2026['area_key'] = (
+    numeric_area.astype('Int64').astype(object).where(numeric_area.notna(), slspc_2026['rating_area'])
+)
 
 print(f"Found {len(slspc_2026)} state/rating area combinations")
 
@@ -55,62 +62,20 @@ yaml_path = '../policyengine-us/policyengine_us/parameters/gov/aca/state_rating_
 print(f"Loading existing YAML from {yaml_path}...")
 
 with open(yaml_path, 'r') as f:
-    # Read as string to preserve header
-    content = f.read()
-
-# Split header from data
-lines = content.split('\n')
-header_lines = []
-data_start = 0
-
-for i, line in enumerate(lines):
-    if line.strip() and not line.startswith(' ') and ':' in line and line.split(':')[0].isupper():
-        # Found first state
-        data_start = i
-        break
-    header_lines.append(line)
-
-header = '\n'.join(header_lines)
-
-# Parse just the data section
-data_content = '\n'.join(lines[data_start:])
-data = yaml.safe_load(data_content)
-
-# Convert to OrderedDict to preserve state order
-ordered_data = OrderedDict()
-for state in sorted(data.keys()):
-    ordered_data[state] = OrderedDict()
-    # Sort areas but keep the original type (int for numeric, str for alphanumeric)
-    area_keys = list(data[state].keys())
-    # Separate numeric and alphanumeric keys
-    numeric_keys = [k for k in area_keys if isinstance(k, int)]
-    string_keys = [k for k in area_keys if isinstance(k, str)]
-    # Sort each group
-    sorted_keys = sorted(numeric_keys) + sorted(string_keys, key=lambda x: (int(''.join(filter(str.isdigit, x))) if any(c.isdigit() for c in x) else 0, x))
-
-    for area in sorted_keys:
-        # Convert all date keys to strings for consistent sorting
-        area_dates = {}
-        for date_key, value in data[state][area].items():
-            if isinstance(date_key, str):
-                area_dates[date_key] = value
-            else:
-                # Convert datetime.date to string
-                area_dates[str(date_key)] = value
-        ordered_data[state][area] = OrderedDict(sorted(area_dates.items()))
-
-# Debug: Show what's in ordered_data for AK
-print("\nDEBUG: AK rating areas in ordered_data:")
-if 'AK' in ordered_data:
-    print(f"  Keys: {list(ordered_data['AK'].keys())}")
-    print(f"  Types: {[type(k) for k in ordered_data['AK'].keys()]}")
+    data = yaml.load(f)
+
+# Debug: Show what's in the YAML for AK
+print("\nDEBUG: AK rating areas in YAML:")
+if 'AK' in data:
+    print(f"  Keys: {list(data['AK'].keys())}")
+    print(f"  Types: {[type(k) for k in data['AK'].keys()]}")
 else:
     print("  AK not found!")
 
 # Debug: Show what we're trying to match
 print("\nDEBUG: First 5 areas from slspc_2026:")
-for i, ((state, area), cost) in enumerate(list(slspc_2026.items())[:5]):
-    print(f"  ({state}, {area}) -> type={type(area)}, cost={cost}")
+for state, area, cost, area_key in slspc_2026.head().itertuples(index=False):
+    print(f"  ({state}, {area}) -> key={area_key!r}, cost={cost}")
 
 # Add 2026 values
 print("\nAdding 2026 values...")
@@ -118,38 +83,20 @@ added_count = 0
 missing_areas = []
 updated_areas = []
 
-for (state, area), cost in slspc_2026.items():
-    # Handle both numeric and alphanumeric rating areas (e.g., ME has '3N', '3S')
-    # The YAML has integer keys (1, 2, 3) for numeric areas and string keys for alphanumeric ('3N', '3S')
-    # The CSV data comes as strings, so we need to convert numeric strings to integers
-    if isinstance(area, str):
-        # Try to convert to int - if it succeeds, use int key
-        try:
-            area_key = int(area)
-            area_display = area
-        except ValueError:
-            # It's alphanumeric like '3N', '3S' - keep as string
-            area_key = area
-            area_display = area
-    elif isinstance(area, float):
-        area_key = int(area)
-        area_display = str(int(area))
-    else:
-        # Already an int
-        area_key = area
-        area_display = str(area)
-
-    if state not in ordered_data:
+for state, area, cost, area_key in slspc_2026.itertuples(index=False):
+    area_display = str(area_key)
+
+    if state not in data:
         print(f"WARNING: State {state} not in existing YAML, skipping")
         continue
 
-    if area_key not in ordered_data[state]:
+    if area_key not in data[state]:
         print(f"WARNING: Rating area {state}-{area_display} not in existing YAML, skipping")
         missing_areas.append(f"{state}-{area_display}")
         continue
 
     # Add 2026 value to existing rating area
-    ordered_data[state][area_key]['2026-01-01'] = float(cost)
+    data[state][area_key][datetime.date.fromisoformat(DATE_2026)] = float(cost)
     updated_areas.append(f"{state}-{area_display}")
     added_count += 1
 
@@ -165,14 +112,7 @@ if missing_areas:
 # Write back
 print(f"Writing updated YAML to {yaml_path}...")
 with open(yaml_path, 'w') as f:
-    # Write header
-    f.write(header)
-    if not header.endswith('\n'):
-        f.write('\n')
-
-    # Write data with proper formatting
-    yaml_str = yaml.dump(ordered_data, default_flow_style=False, sort_keys=False, allow_unicode=True)
-    f.write(yaml_str)
+    yaml.dump(data, f)
 
 print("✓ YAML update complete!")
 print(f"\nSummary:")